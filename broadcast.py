@@ -0,0 +1,250 @@
+"""
+Moteur de diffusion concurrent des prédictions vers les utilisateurs
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from telethon.errors import FloodWaitError
+
+from clock import SystemClock
+
+logger = logging.getLogger(__name__)
+
+
+class FloodControl:
+    """
+    Limites anti-flood Telegram partagées entre envois et éditions:
+    un seau à jetons global et un espacement minimal par chat.
+    """
+
+    def __init__(self, global_rate: float = 25.0, burst: int = None, per_chat_interval: float = 1.0,
+                 clock: SystemClock = None):
+        self.clock = clock or SystemClock()
+        self.rate = global_rate
+        self.burst = burst or max(1, int(global_rate))
+        self.per_chat_interval = per_chat_interval
+        self._tokens = float(self.burst)
+        self._updated = self.clock.monotonic()
+        self._chat_next = {}
+
+    def penalize(self, chat_id: int, seconds: float):
+        """Bloque un chat pendant `seconds` (FloodWait reçu pour ce destinataire)."""
+        self._chat_next[chat_id] = self.clock.monotonic() + seconds
+
+    def chat_delay(self, chat_id: int) -> float:
+        return max(0.0, self._chat_next.get(chat_id, 0.0) - self.clock.monotonic())
+
+    async def acquire(self, chat_id: int):
+        delay = self.chat_delay(chat_id)
+        if delay > 0:
+            await self.clock.sleep(delay)
+
+        while True:
+            now = self.clock.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                break
+            await self.clock.sleep((1 - self._tokens) / self.rate)
+
+        self._chat_next[chat_id] = self.clock.monotonic() + self.per_chat_interval
+        if len(self._chat_next) > 50000:
+            self._prune()
+
+    def _prune(self):
+        now = self.clock.monotonic()
+        self._chat_next = {cid: t for cid, t in self._chat_next.items() if t > now}
+
+
+@dataclass
+class BroadcastReport:
+    """Résultat d'une diffusion: {user_id: résultat} et mesures de temps."""
+    results: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    flood_waits: int = 0
+    flood_wait_seconds: float = 0.0
+    started_at: float = 0.0
+    first_at: float = None
+    last_at: float = None
+    finished_at: float = 0.0
+
+    @property
+    def sent(self) -> int:
+        return len(self.results)
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    @property
+    def time_to_first(self) -> float:
+        return (self.first_at - self.started_at) if self.first_at else 0.0
+
+    @property
+    def time_to_last(self) -> float:
+        return (self.last_at - self.started_at) if self.last_at else 0.0
+
+    @property
+    def duration(self) -> float:
+        return self.finished_at - self.started_at
+
+
+class BroadcastEngine:
+    """
+    Pool de workers sur une asyncio.Queue: chaque destinataire est traité
+    par `action(user_id)` en respectant FloodControl. Un FloodWaitError ne
+    bloque que le destinataire concerné, remis en file après le délai.
+    """
+
+    def __init__(self, flood: FloodControl, concurrency: int = 20,
+                 max_retries: int = 3, max_flood_wait: float = 120.0):
+        self.flood = flood
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.max_flood_wait = max_flood_wait
+
+    async def run(self, recipients, action) -> BroadcastReport:
+        clock = self.flood.clock
+        report = BroadcastReport(started_at=clock.monotonic())
+        queue = asyncio.Queue()
+        outstanding = 0
+        done = asyncio.Event()
+        timers = []
+
+        for user_id in recipients:
+            queue.put_nowait((user_id, 0))
+            outstanding += 1
+
+        if outstanding == 0:
+            report.finished_at = clock.monotonic()
+            return report
+
+        async def requeue(item, seconds):
+            await clock.sleep(seconds)
+            queue.put_nowait(item)
+
+        def finish_one():
+            nonlocal outstanding
+            outstanding -= 1
+            if outstanding == 0:
+                done.set()
+
+        async def worker():
+            while True:
+                user_id, attempt = await queue.get()
+                try:
+                    await self.flood.acquire(user_id)
+                    result = await action(user_id)
+                except FloodWaitError as e:
+                    seconds = float(getattr(e, 'seconds', 0) or 1)
+                    report.flood_waits += 1
+                    report.flood_wait_seconds += seconds
+                    if attempt < self.max_retries and seconds <= self.max_flood_wait:
+                        self.flood.penalize(user_id, seconds)
+                        timers.append(asyncio.create_task(requeue((user_id, attempt + 1), seconds)))
+                        continue
+                    report.errors[user_id] = e
+                    finish_one()
+                except Exception as e:
+                    report.errors[user_id] = e
+                    finish_one()
+                else:
+                    now = clock.monotonic()
+                    if report.first_at is None:
+                        report.first_at = now
+                    report.last_at = now
+                    report.results[user_id] = result
+                    finish_one()
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, outstanding))]
+        try:
+            await done.wait()
+        finally:
+            for task in timers + workers:
+                task.cancel()
+            await asyncio.gather(*timers, *workers, return_exceptions=True)
+
+        report.finished_at = clock.monotonic()
+        return report
+
+
+class _EditJob:
+    def __init__(self, text: str):
+        self.text = text
+        self.version = 1
+        self.applied = {}
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class EditPipeline:
+    """
+    Édition parallèle des messages d'une prédiction, avec coalescence:
+    si un nouveau statut arrive pendant qu'une édition est en cours pour
+    la même clé, seul le dernier texte est envoyé aux utilisateurs restants,
+    puis les utilisateurs déjà édités avec un ancien texte sont rattrapés.
+    `on_report(key, report)` est appelé une fois par édition exécutée (les
+    appels coalescés reçoivent le même rapport sans le compter à nouveau).
+    """
+
+    def __init__(self, engine: BroadcastEngine, edit, on_report=None):
+        self.engine = engine
+        self.edit = edit
+        self.on_report = on_report
+        self._jobs = {}
+
+    def in_flight(self, key) -> bool:
+        return key in self._jobs
+
+    async def submit(self, key, messages: dict, text: str) -> BroadcastReport:
+        job = self._jobs.get(key)
+        if job is not None:
+            job.text = text
+            job.version += 1
+            logger.debug(f"Édition {key} coalescée (version {job.version})")
+            return await asyncio.shield(job.future)
+
+        job = _EditJob(text)
+        self._jobs[key] = job
+        try:
+            report = await self._run(job, messages)
+        except Exception as e:
+            job.future.set_exception(e)
+            job.future.exception()
+            raise
+        else:
+            if self.on_report is not None:
+                self.on_report(key, report)
+            job.future.set_result(report)
+            return report
+        finally:
+            del self._jobs[key]
+
+    async def _run(self, job: _EditJob, messages: dict) -> BroadcastReport:
+        async def edit_one(user_id):
+            version, text = job.version, job.text
+            await self.edit(user_id, messages[user_id], text)
+            job.applied[user_id] = version
+            return version
+
+        total = None
+        pending = list(messages)
+        while pending:
+            report = await self.engine.run(pending, edit_one)
+            if total is None:
+                total = report
+            else:
+                for uid in report.results:
+                    total.errors.pop(uid, None)
+                total.results.update(report.results)
+                total.errors.update(report.errors)
+                total.flood_waits += report.flood_waits
+                total.flood_wait_seconds += report.flood_wait_seconds
+                total.first_at = total.first_at or report.first_at
+                total.last_at = report.last_at or total.last_at
+                total.finished_at = report.finished_at
+            pending = [uid for uid, v in job.applied.items()
+                       if v < job.version and uid in messages]
+        now = self.engine.flood.clock.monotonic()
+        return total or BroadcastReport(started_at=now, finished_at=now)
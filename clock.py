@@ -0,0 +1,101 @@
+"""
+Horloges injectables pour les chemins temporels du bot (cycle R1, essais,
+abonnements, timeouts, reset quotidien)
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Horloge de production: heure murale et asyncio.sleep."""
+
+    def now(self, tz=None) -> datetime:
+        return datetime.now(tz)
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(max(0.0, seconds))
+
+
+class MonotonicClock(SystemClock):
+    """
+    Heure murale ancrée au démarrage puis avancée par time.monotonic():
+    insensible aux sauts de l'horloge système (NTP, changement manuel).
+    """
+
+    def __init__(self):
+        self._wall0 = datetime.now().astimezone()
+        self._mono0 = time.monotonic()
+
+    def now(self, tz=None) -> datetime:
+        current = self._wall0 + timedelta(seconds=time.monotonic() - self._mono0)
+        if tz is None:
+            return current.astimezone().replace(tzinfo=None)
+        return current.astimezone(tz)
+
+
+class SimulatedClock(SystemClock):
+    """
+    Horloge virtuelle pour tests et bancs d'essai: sleep() attend que le
+    temps simulé soit avancé par advance()/advance_to(), ce qui permet de
+    dérouler 24h de trafic en quelques secondes.
+    """
+
+    def __init__(self, start: datetime = None):
+        self.current = start or datetime(2026, 1, 1)
+        self._mono = 0.0
+        self._sleepers = []
+        self._seq = itertools.count()
+
+    def now(self, tz=None) -> datetime:
+        if tz is None:
+            return self.current
+        return self.current.astimezone(tz)
+
+    def monotonic(self) -> float:
+        return self._mono
+
+    def set(self, when: datetime):
+        """Déplace l'horloge sans réveiller les tâches endormies."""
+        self._mono += max(0.0, (when - self.current).total_seconds())
+        self.current = when
+
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self._mono + seconds, next(self._seq), future))
+        await future
+
+    @property
+    def next_deadline(self):
+        return self._sleepers[0][0] - self._mono if self._sleepers else None
+
+    async def advance_to(self, when: datetime):
+        await self.advance((when - self.current).total_seconds())
+
+    async def advance(self, seconds: float):
+        """Avance le temps en réveillant chaque tâche à son échéance, dans l'ordre."""
+        target = self._mono + max(0.0, seconds)
+        while self._sleepers and self._sleepers[0][0] <= target:
+            deadline, _, future = heapq.heappop(self._sleepers)
+            self.set(self.current + timedelta(seconds=deadline - self._mono))
+            if not future.done():
+                future.set_result(None)
+            # Laisse la tâche réveillée s'exécuter jusqu'à son prochain await
+            for _ in range(3):
+                await asyncio.sleep(0)
+        self.set(self.current + timedelta(seconds=target - self._mono))
+        await asyncio.sleep(0)
+
+
+def make_clock(kind: str) -> SystemClock:
+    if kind == 'monotonic':
+        return MonotonicClock()
+    return SystemClock()
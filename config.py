@@ -43,3 +43,34 @@ SUIT_DISPLAY = {
     '♦': '♦️ Carreau (Rouge)',
     '♣': '♣️ Trèfle (Noir)'
 }
+
+# Diffusion des prédictions (limites anti-flood Telegram)
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY') or '20')
+BROADCAST_GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE') or '25')
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv('BROADCAST_PER_CHAT_INTERVAL') or '1')
+BROADCAST_MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES') or '3')
+
+# Enregistrement du flux des canaux sources (JSONL) pour tools/replay.py
+RECORD_STREAM = os.getenv('RECORD_STREAM') or ''
+
+# Horloge: 'system' (heure murale) ou 'monotonic' (insensible aux sauts d'horloge)
+BOT_CLOCK = os.getenv('BOT_CLOCK') or 'system'
+
+# État du moteur de prédiction (instantané + journal) pour reprendre après un redémarrage ('' = désactivé)
+ENGINE_STATE_FILE = os.getenv('ENGINE_STATE_FILE') or 'engine_state.json'
+ENGINE_SNAPSHOT_EVERY = int(os.getenv('ENGINE_SNAPSHOT_EVERY') or '200')
+
+# Journalisation: niveau global, niveaux par sous-système ('broadcast=WARNING,telethon=ERROR')
+# et nombre d'exemples conservés par classe d'erreur lors d'une diffusion
+LOG_LEVEL = os.getenv('LOG_LEVEL') or 'INFO'
+LOG_LEVELS = os.getenv('LOG_LEVELS') or ''
+LOG_ERROR_SAMPLES = int(os.getenv('LOG_ERROR_SAMPLES') or '3')
+
+# Envoi réparti sur plusieurs processus (0 = envoi depuis le processus du bot)
+SENDER_WORKERS = int(os.getenv('SENDER_WORKERS') or '0')
+SENDER_SOCKET = os.getenv('SENDER_SOCKET') or ''
+
+# Mode actif/secours: durée du bail leader en secondes (0 = instance unique) et
+# identifiant de l'instance (défaut: hôte:pid)
+LEADER_LEASE_TTL = float(os.getenv('LEADER_LEASE_TTL') or '0')
+INSTANCE_ID = os.getenv('INSTANCE_ID') or ''
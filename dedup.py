@@ -0,0 +1,79 @@
+"""
+Dédoublonnage borné des messages finalisés, par fenêtre de numéros de jeu
+"""
+
+
+class GameDedup:
+    """
+    {numéro de jeu: empreintes de contenu déjà traitées}. Seuls les jeux à
+    moins de `window` numéros du plus grand jeu vu sont conservés: la mémoire
+    reste constante sur plusieurs jours, même sans reset quotidien.
+
+    Un jeu en retard de plus de `window` sur ce maximum est rejeté (compté
+    dans `stale`) sans toucher à la fenêtre. Une chute de plus de `wrap_gap`
+    numéros est en revanche un retour du compteur à 1: nouvelle séquence.
+    """
+
+    def __init__(self, window: int = 50, max_per_game: int = 8, wrap_gap: int = 500):
+        self.window = window
+        self.max_per_game = max_per_game
+        self.wrap_gap = wrap_gap
+        self._games = {}
+        self.max_game = None
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return sum(len(hashes) for hashes in self._games.values())
+
+    def clear(self):
+        self._games.clear()
+        self.max_game = None
+
+    def check_and_add(self, game_number: int, content: str) -> bool:
+        """Retourne True si (jeu, contenu) a déjà été vu ou est périmé, sinon l'enregistre."""
+        if self.max_game is not None and game_number < self.max_game - self.window:
+            if self.max_game - game_number <= self.wrap_gap:
+                self.stale += 1
+                return True
+            # Retour du compteur à 1: l'ancienne séquence ne reviendra plus
+            self.evictions += len(self._games)
+            self._games.clear()
+            self.max_game = None
+
+        digest = hash(content)
+        hashes = self._games.get(game_number)
+        if hashes is not None and digest in hashes:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        if hashes is None:
+            hashes = self._games[game_number] = []
+            if self.max_game is None or game_number > self.max_game:
+                self.max_game = game_number
+                self._evict()
+        elif len(hashes) >= self.max_per_game:
+            hashes.pop(0)
+        hashes.append(digest)
+        return False
+
+    def _evict(self):
+        # Un jeu en retard peut être inséré après de plus récents: on balaie
+        # toute la fenêtre (au plus window + 1 jeux) plutôt que la seule tête.
+        cutoff = self.max_game - self.window
+        for game in [g for g in self._games if g < cutoff]:
+            del self._games[game]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            'games': len(self._games),
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,157 @@
+"""
+Routage des mises à jour Telegram: chaque update est classée une seule fois
+(canal source, commande, admin, utilisateur privé, callback) puis confiée à
+un seul handler via une table.
+"""
+import logging
+import re
+import time
+
+from telethon import events
+
+logger = logging.getLogger(__name__)
+
+
+class RouteStats:
+    __slots__ = ('count', 'errors', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float, failed: bool):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if failed:
+            self.errors += 1
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Dispatcher:
+    """
+    Un seul handler Telethon par type d'update. Les routes:
+      source / source_edit  -> messages des canaux sources
+      command:/xxx          -> commandes en privé (table par nom de commande)
+      admin / private       -> texte libre de l'admin / d'un utilisateur
+      callback:xxx          -> boutons inline (table par préfixe de data)
+    """
+
+    def __init__(self, source_chats, admin_id: int):
+        self.source_chats = set(source_chats)
+        self.admin_id = admin_id
+        self.commands = {}
+        self.callbacks = {}
+        self.routes = {}
+        self.stats = {}
+        # gate() faux: toutes les mises à jour sont ignorées (instance de secours)
+        self.gate = None
+
+    # ---- Enregistrement ----
+    def command(self, name: str, pattern: str = None):
+        """Enregistre /name; `pattern` (regex) fournit event.pattern_match."""
+        regex = re.compile(pattern) if pattern else None
+
+        def decorator(func):
+            self.commands[name] = (regex, func)
+            return func
+        return decorator
+
+    def callback(self, prefix: bytes, pattern: bytes):
+        regex = re.compile(pattern)
+
+        def decorator(func):
+            self.callbacks[prefix] = (regex, func)
+            return func
+        return decorator
+
+    def route(self, name: str):
+        def decorator(func):
+            self.routes[name] = func
+            return func
+        return decorator
+
+    def attach(self, client):
+        client.add_event_handler(self.on_new_message, events.NewMessage())
+        client.add_event_handler(self.on_edited_message, events.MessageEdited())
+        client.add_event_handler(self.on_callback, events.CallbackQuery())
+
+    # ---- Classification ----
+    def classify_message(self, event, edited: bool = False):
+        if event.chat_id in self.source_chats:
+            return ('source_edit' if edited else 'source'), self.routes.get('source_edit' if edited else 'source')
+        if edited or not event.is_private:
+            return None, None
+
+        text = event.message.message or ''
+        if text.startswith('/'):
+            name = text.split(maxsplit=1)[0].split('@', 1)[0]
+            entry = self.commands.get(name)
+            if entry is None:
+                return None, None
+            regex, func = entry
+            if regex is not None:
+                match = regex.match(text)
+                if match is None:
+                    return None, None
+                event.pattern_match = match
+            return f"command:{name}", func
+
+        if event.sender_id == self.admin_id:
+            return 'admin', self.routes.get('admin')
+        return 'private', self.routes.get('private')
+
+    def classify_callback(self, event):
+        data = event.data or b''
+        prefix = data.split(b'_', 1)[0]
+        entry = self.callbacks.get(prefix)
+        if entry is None:
+            return None, None
+        regex, func = entry
+        match = regex.match(data)
+        if match is None:
+            return None, None
+        event.data_match = match
+        return f"callback:{prefix.decode(errors='replace')}", func
+
+    # ---- Exécution ----
+    async def _run(self, route: str, func, event):
+        if func is None or (self.gate is not None and not self.gate()):
+            return
+        start = time.perf_counter()
+        failed = False
+        try:
+            await func(event)
+        except Exception as e:
+            failed = True
+            logger.error(f"Erreur route {route}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+        finally:
+            stats = self.stats.get(route)
+            if stats is None:
+                stats = self.stats[route] = RouteStats()
+            stats.record(time.perf_counter() - start, failed)
+
+    async def on_new_message(self, event):
+        route, func = self.classify_message(event)
+        await self._run(route, func, event)
+
+    async def on_edited_message(self, event):
+        route, func = self.classify_message(event, edited=True)
+        await self._run(route, func, event)
+
+    async def on_callback(self, event):
+        route, func = self.classify_callback(event)
+        await self._run(route, func, event)
+
+    def summary(self, limit: int = 8) -> list:
+        """Routes les plus sollicitées: (route, nb, moyenne ms, max ms, erreurs)."""
+        ranked = sorted(self.stats.items(), key=lambda kv: kv[1].count, reverse=True)
+        return [(name, s.count, s.avg * 1000, s.max * 1000, s.errors) for name, s in ranked[:limit]]
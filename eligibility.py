@@ -0,0 +1,71 @@
+"""
+Index des utilisateurs éligibles aux prédictions, ordonné par fin d'accès
+"""
+import heapq
+
+
+class EligibilityIndex:
+    """
+    user_id -> fin d'accès (timestamp). Un tas trié par expiration donne la
+    prochaine échéance: le balayage des expirations (prune) retire chaque
+    utilisateur à sa fin d'accès, la lecture des destinataires et le comptage
+    n'ont donc aucune logique d'expiration.
+    """
+
+    def __init__(self):
+        self._expiry = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def clear(self):
+        self._expiry.clear()
+        self._heap.clear()
+
+    def update(self, user_id: str, expiry: float = None):
+        """Définit (ou retire si None) la fin d'accès d'un utilisateur."""
+        if expiry is None:
+            self._expiry.pop(user_id, None)
+            return
+        if self._expiry.get(user_id) == expiry:
+            return
+        self._expiry[user_id] = expiry
+        heapq.heappush(self._heap, (expiry, user_id))
+        if len(self._heap) > 2 * len(self._expiry) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [(exp, uid) for uid, exp in self._expiry.items()]
+        heapq.heapify(self._heap)
+
+    def prune(self, now: float) -> list:
+        """Retire et retourne les utilisateurs dont l'accès a expiré à `now`."""
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            exp, uid = heapq.heappop(heap)
+            if self._expiry.get(uid) == exp:
+                del self._expiry[uid]
+                expired.append(uid)
+        return expired
+
+    def next_expiry(self):
+        """Prochaine fin d'accès (timestamp), None si l'index est vide."""
+        heap = self._heap
+        while heap:
+            exp, uid = heap[0]
+            if self._expiry.get(uid) == exp:
+                return exp
+            heapq.heappop(heap)
+        return None
+
+    def expiry(self, user_id: str):
+        return self._expiry.get(user_id)
+
+    def is_eligible(self, user_id: str, now: float) -> bool:
+        exp = self._expiry.get(user_id)
+        return exp is not None and exp > now
+
+    def members(self) -> list:
+        return list(self._expiry)
@@ -0,0 +1,254 @@
+"""
+Persistance de l'état du moteur de prédiction: instantané JSON compact +
+journal append-only (JSONL) des changements depuis le dernier instantané.
+Au redémarrage, instantané puis journal sont rejoués pour reprendre les
+prédictions en cours (et leurs message_id) là où elles en étaient.
+"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('pending', 'queued')
+
+
+def _strip(pred: dict) -> dict:
+    """Entrée sans private_messages (journalisés à part, à la livraison)."""
+    return {k: v for k, v in pred.items() if k != 'private_messages'}
+
+
+def _copy_state(state: dict) -> dict:
+    """Copie indépendante de l'état, sérialisable hors de la boucle asyncio."""
+    pending = {}
+    for game, pred in state['pending'].items():
+        pred = dict(pred)
+        if 'private_messages' in pred:
+            pred['private_messages'] = dict(pred['private_messages'])
+        pending[game] = pred
+    return {
+        'engine': copy.deepcopy(state['engine']),
+        'pending': pending,
+        'queued': {game: dict(data) for game, data in state['queued'].items()},
+    }
+
+
+class EngineJournal:
+    """
+    État suivi: {'engine': {champ: valeur}, 'pending': {jeu: préd.},
+    'queued': {jeu: données}}. track() n'écrit que les différences avec le
+    dernier état vu; un instantané complet est réécrit tous les
+    `snapshot_every` enregistrements et le journal repart à zéro.
+
+    L'instantané périodique est sérialisé dans un thread à partir d'une
+    copie de l'état: le journal reste valable jusqu'au remplacement du
+    fichier (les enregistrements sont des valeurs absolues, rejouables sur
+    un instantané plus récent), puis il est réécrit avec les seuls
+    enregistrements postérieurs à la copie.
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 200):
+        self.snapshot_path = path
+        self.journal_path = path + '.journal'
+        self.snapshot_every = snapshot_every
+        self.records = 0
+        self.snapshots = 0
+        self._since_snapshot = 0
+        self._last = None
+        self._file = None
+        # _seq invalide une écriture en cours (instantané synchrone, close())
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._writing = None
+        self._carry = None
+
+    # ---- Chargement ----
+    def load(self):
+        """État reconstruit (instantané + journal), ou None si rien n'est enregistré."""
+        state = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Instantané moteur illisible ({e}), reprise depuis le journal")
+
+        if os.path.exists(self.journal_path):
+            state = state or {'engine': {}, 'pending': {}, 'queued': {}}
+            applied = 0
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        logger.warning("Journal moteur: ligne illisible ignorée")
+                        continue
+                    self._apply(state, record)
+                    applied += 1
+            logger.debug(f"Journal moteur: {applied} enregistrements rejoués")
+        return state
+
+    def signature(self) -> tuple:
+        """(mtime, taille) de l'instantané et du journal: change dès qu'un enregistrement est écrit."""
+        marks = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = os.stat(path)
+                marks.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                marks.append(None)
+        return tuple(marks)
+
+    @staticmethod
+    def _apply(state: dict, record: dict):
+        state['engine'].update(record.get('engine', {}))
+        for section in SECTIONS:
+            entries = state[section]
+            for game, data in record.get(section, {}).items():
+                if data is None:
+                    entries.pop(game, None)
+                    continue
+                previous = entries.get(game)
+                if section == 'pending' and previous is not None and 'private_messages' not in data:
+                    data['private_messages'] = previous.get('private_messages', {})
+                entries[game] = data
+        for game, messages in record.get('messages', {}).items():
+            pred = state['pending'].get(game)
+            if pred is not None:
+                pred.setdefault('private_messages', {}).update(messages)
+
+    def set_aside(self):
+        """Conserve une copie (.corrupt) des fichiers illisibles avant de les réécrire."""
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path):
+                shutil.copyfile(path, path + '.corrupt')
+                logger.warning(f"Copie de sauvegarde: {path}.corrupt")
+
+    # ---- Écriture ----
+    def _append(self, record: dict):
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self.records += 1
+        self._since_snapshot += 1
+        if self._carry is not None:
+            self._carry.append(record)
+
+    def _remember(self, state: dict):
+        self._last = {
+            'engine': copy.deepcopy(state['engine']),
+            'pending': {game: _strip(pred) for game, pred in state['pending'].items()},
+            'queued': {game: dict(data) for game, data in state['queued'].items()},
+        }
+
+    def _next_seq(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def _write_snapshot(self, state: dict, seq: int) -> bool:
+        with self._lock:
+            if seq != self._seq:
+                return False
+            tmp = self.snapshot_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, self.snapshot_path)
+            return True
+
+    def _restart_journal(self, records):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, 'w', encoding='utf-8')
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self._since_snapshot = len(records)
+        self.snapshots += 1
+
+    def snapshot(self, state: dict):
+        """Écrit l'instantané complet (remplacement atomique) puis vide le journal (démarrage, arrêt)."""
+        self._write_snapshot(state, self._next_seq())
+        self._carry = None
+        self._restart_journal(())
+        self._remember(state)
+
+    def snapshot_in_background(self, state: dict):
+        """Instantané d'une copie de `state`, sérialisé dans un thread."""
+        seq = self._next_seq()
+        captured = _copy_state(state)
+        self._carry = []
+        self._writing = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(self._write_snapshot, captured, seq))
+        self._writing.add_done_callback(lambda task: self._snapshot_done(task, seq))
+
+    def _snapshot_done(self, task, seq: int):
+        self._writing = None
+        if seq != self._seq:
+            return
+        carry, self._carry = self._carry, None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            # Ancien instantané + journal complet toujours valables: nouvel essai au prochain track()
+            logger.error(f"Instantané moteur non écrit: {task.exception()}")
+            return
+        if task.result():
+            self._restart_journal(carry)
+
+    def track(self, state: dict):
+        """Journalise les changements depuis le dernier appel (instantané si nécessaire)."""
+        if self._last is None:
+            self.snapshot(state)
+            return
+
+        record = {}
+        last_engine = self._last['engine']
+        changed = {k: v for k, v in state['engine'].items() if last_engine.get(k) != v}
+        if changed:
+            record['engine'] = copy.deepcopy(changed)
+
+        for section in SECTIONS:
+            last = self._last[section]
+            current = state[section]
+            delta = {}
+            for game, data in current.items():
+                old = last.get(game)
+                if section == 'pending':
+                    if old is None:
+                        # Nouvelle entrée: private_messages inclus (copie des rattrapages)
+                        delta[game] = dict(data, private_messages=dict(data.get('private_messages', {})))
+                    elif _strip(data) != old:
+                        delta[game] = _strip(data)
+                elif old != data:
+                    delta[game] = dict(data)
+            for game in last:
+                if game not in current:
+                    delta[game] = None
+            if delta:
+                record[section] = delta
+
+        if record:
+            self._append(record)
+            self._remember(state)
+        if self._since_snapshot >= self.snapshot_every and self._writing is None:
+            self.snapshot_in_background(state)
+
+    def record_messages(self, game: str, messages: dict):
+        """Journalise les message_id d'une diffusion terminée."""
+        if messages:
+            self._append({'messages': {game: messages}})
+
+    def close(self):
+        # Une écriture d'instantané encore en cours ne touchera plus aux fichiers
+        self._next_seq()
+        self._carry = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
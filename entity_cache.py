@@ -0,0 +1,62 @@
+"""
+Cache des entités Telegram (chats, expéditeurs) avec durée de vie
+"""
+from collections import OrderedDict
+
+from clock import SystemClock
+
+
+class EntityCache:
+    """
+    peer_id -> entité, valable `ttl` secondes, au plus `maxsize` entrées (LRU).
+    Évite un aller-retour réseau get_chat()/get_sender() à chaque update.
+    """
+
+    def __init__(self, ttl: float = 600.0, maxsize: int = 10000, clock: SystemClock = None):
+        self.clock = clock or SystemClock()
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, peer_id):
+        item = self._items.get(peer_id)
+        if item is None:
+            return None
+        entity, expires = item
+        if expires < self.clock.monotonic():
+            del self._items[peer_id]
+            return None
+        self._items.move_to_end(peer_id)
+        return entity
+
+    def put(self, peer_id, entity):
+        self._items[peer_id] = (entity, self.clock.monotonic() + self.ttl)
+        self._items.move_to_end(peer_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    async def resolve(self, peer_id, fetch):
+        """Retourne l'entité en cache, sinon attend `fetch()` et la met en cache."""
+        if peer_id is not None:
+            entity = self.get(peer_id)
+            if entity is not None:
+                self.hits += 1
+                return entity
+        self.misses += 1
+        entity = await fetch()
+        if entity is not None and peer_id is not None:
+            self.put(peer_id, entity)
+        return entity
+
+
+def marked_channel_id(chat) -> int:
+    """ID de canal au format -100xxxxxxxxxx à partir d'une entité chat."""
+    chat_id = chat.id
+    if getattr(chat, 'broadcast', False) and not str(chat_id).startswith('-100'):
+        chat_id = int(f"-100{abs(chat_id)}")
+    return chat_id
@@ -0,0 +1,209 @@
+"""
+Acteur de l'état de jeu: un seul consommateur applique, dans l'ordre, tous
+les événements qui modifient l'état des prédictions (messages sources, file
+d'attente, commandes admin). Les envois et éditions Telegram sont confiés à
+une file d'E/S séparée: la logique de jeu n'attend jamais le réseau.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+# ============ ÉVÉNEMENTS ============
+class SourceMessage(NamedTuple):
+    """Message (nouveau ou édité) d'un canal source; `received` en clock.monotonic()."""
+    text: str
+    chat_id: int
+    edited: bool = False
+    received: float = None
+
+
+class DrainQueue(NamedTuple):
+    """Envoi des prédictions en file d'attente à partir du jeu `game`."""
+    game: int
+
+
+class DeliveryFailed(NamedTuple):
+    """Diffusion de la prédiction `game` sans aucun destinataire: état R1/R2 à rétablir."""
+    game: int
+    sequence: int
+    previous: dict
+
+
+class Call(NamedTuple):
+    """Fonction exécutée dans l'acteur (commandes admin, reset); résultat via `future` (ou None)."""
+    func: Callable
+    args: tuple
+    future: Any
+
+
+# ============ ACTEUR ============
+class GameActor:
+    """
+    File asyncio d'événements typés, consommée par une seule tâche (run()).
+    Les handlers sont enregistrés par type d'événement avec @actor.on(Type);
+    les observateurs (@actor.observe) sont appelés après chaque événement.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.observers = []
+        self.current = None
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.max_lag = 0.0
+        self.reset()
+
+    def reset(self):
+        """Nouvelle file vide (nouvelle boucle asyncio: relecture, tests)."""
+        self._queue = asyncio.Queue()
+
+    def on(self, event_type):
+        def decorator(func):
+            self.handlers[event_type] = func
+            return func
+        return decorator
+
+    def observe(self, func):
+        self.observers.append(func)
+        return func
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def post(self, event):
+        """Dépose un événement sans attendre son traitement."""
+        self._queue.put_nowait((time.perf_counter(), event))
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def post_call(self, func, *args):
+        """Dépose un appel de func(*args) sans attendre son résultat."""
+        self.post(Call(func, args, None))
+
+    async def call(self, func, *args):
+        """Exécute func(*args) dans l'acteur, après les événements déjà en file."""
+        future = asyncio.get_running_loop().create_future()
+        self.post(Call(func, args, future))
+        return await future
+
+    async def join(self):
+        """Attend que tous les événements déposés soient traités."""
+        await self._queue.join()
+
+    async def _call(self, event: Call):
+        if event.future is None:
+            result = event.func(*event.args)
+            if asyncio.iscoroutine(result):
+                await result
+            return
+        try:
+            result = event.func(*event.args)
+            if asyncio.iscoroutine(result):
+                result = await result
+        except Exception as e:
+            if not event.future.done():
+                event.future.set_exception(e)
+            return
+        if not event.future.done():
+            event.future.set_result(result)
+
+    async def _handle(self, event):
+        if isinstance(event, Call):
+            await self._call(event)
+            return
+        handler = self.handlers.get(type(event))
+        if handler is None:
+            logger.warning(f"Événement sans handler: {type(event).__name__}")
+            return
+        await handler(event)
+
+    async def run(self):
+        while True:
+            queue = self._queue
+            posted, event = await queue.get()
+            lag = time.perf_counter() - posted
+            if lag > self.max_lag:
+                self.max_lag = lag
+            self.current = event
+            try:
+                await self._handle(event)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Erreur acteur ({type(event).__name__}): {e}")
+                import traceback
+                logger.error(traceback.format_exc())
+            finally:
+                self.current = None
+                self.processed += 1
+                for observer in self.observers:
+                    try:
+                        observer(event)
+                    except Exception as e:
+                        logger.error(f"Erreur observateur acteur: {e}")
+                queue.task_done()
+
+
+# ============ FILE D'E/S ============
+class IOQueue:
+    """
+    Commandes d'E/S (diffusion, édition) lancées hors de l'acteur.
+    submit() ordonne les commandes d'une même clé (numéro de jeu) dans
+    l'ordre de soumission; submit_after() attend seulement ces commandes
+    sans bloquer les suivantes: les éditions d'un statut attendent l'envoi
+    initial mais peuvent se chevaucher (et être coalescées par EditPipeline).
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.errors = 0
+        self.reset()
+
+    def reset(self):
+        self._tails = {}
+        self._tasks = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, key, func, *args):
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run(previous, func, args))
+        self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._done(key, t))
+        self.submitted += 1
+        return task
+
+    def submit_after(self, key, func, *args):
+        task = asyncio.create_task(self._run(self._tails.get(key), func, args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.submitted += 1
+        return task
+
+    async def _run(self, previous, func, args):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            return await func(*args)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erreur E/S {getattr(func, '__name__', func)}: {e}")
+
+    def _done(self, key, task):
+        self._tasks.discard(task)
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def drain(self):
+        """Attend la fin de toutes les commandes en cours."""
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
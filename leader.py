@@ -0,0 +1,144 @@
+"""
+Mode actif/secours: plusieurs instances du bot se disputent un bail (ligne
+SQLite partagée). Seul le détenteur du bail traite les messages, prédit et
+diffuse; une instance de secours reprend le bail dès qu'il expire (ou dès
+qu'il est rendu, lors d'un arrêt propre).
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires REAL NOT NULL,
+    term INTEGER NOT NULL
+);
+"""
+
+
+class SqliteLease:
+    """
+    Bail `name` détenu par `holder` jusqu'à `expires` (timestamp). Le mandat
+    (term) est incrémenté à chaque changement de détenteur.
+    """
+
+    def __init__(self, path: str, name: str, holder: str, ttl: float):
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, timeout=1.0, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def try_acquire(self, now: float):
+        """Prend ou renouvelle le bail; renvoie le mandat détenu, ou None."""
+        with self.lock:
+            conn = self.conn
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT holder, expires, term FROM leases WHERE name = ?", (self.name,)).fetchone()
+                if row is None:
+                    term = 1
+                    conn.execute("INSERT INTO leases (name, holder, expires, term) VALUES (?, ?, ?, ?)",
+                                 (self.name, self.holder, now + self.ttl, term))
+                elif row[0] == self.holder or row[1] <= now:
+                    term = row[2] if row[0] == self.holder else row[2] + 1
+                    conn.execute("UPDATE leases SET holder = ?, expires = ?, term = ? WHERE name = ?",
+                                 (self.holder, now + self.ttl, term, self.name))
+                else:
+                    conn.execute("ROLLBACK")
+                    return None
+                conn.execute("COMMIT")
+                return term
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+    def release(self):
+        """Rend le bail (arrêt propre): l'instance de secours le prend sans attendre l'expiration."""
+        with self.lock:
+            self.conn.execute("UPDATE leases SET expires = 0 WHERE name = ? AND holder = ?",
+                              (self.name, self.holder))
+
+    def current(self):
+        """(détenteur, expiration, mandat) ou None."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT holder, expires, term FROM leases WHERE name = ?", (self.name,)).fetchone()
+
+    def close(self):
+        self.conn.close()
+
+
+class LeaderElection:
+    """
+    Tente de prendre/renouveler le bail tous les ttl/3. is_leader n'est vrai
+    que jusqu'à l'expiration du dernier renouvellement réussi: une instance
+    bloquée (ou coupée de la base) cesse d'agir avant qu'une autre reprenne.
+    Callbacks (coroutines): on_promote(term), on_demote(), on_standby() à
+    chaque tour passé en secours.
+    """
+
+    def __init__(self, lease: SqliteLease, clock, on_promote=None, on_demote=None, on_standby=None):
+        self.lease = lease
+        self.clock = clock
+        self.on_promote = on_promote
+        self.on_demote = on_demote
+        self.on_standby = on_standby
+        self.renew_interval = lease.ttl / 3
+        self.term = None
+        self.valid_until = 0.0
+        self.promotions = 0
+        self.errors = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self.term is not None and self.clock.now().timestamp() < self.valid_until
+
+    async def step(self):
+        now = self.clock.now().timestamp()
+        try:
+            term = await asyncio.to_thread(self.lease.try_acquire, now)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Bail {self.lease.name}: renouvellement impossible ({e})")
+            term = self.term if self.is_leader else None
+        else:
+            if term is not None:
+                self.valid_until = now + self.lease.ttl
+
+        was_leader = self.term is not None
+        if term is not None and (not was_leader or term != self.term):
+            self.term = term
+            self.promotions += 1
+            logger.info(f"👑 {self.lease.holder}: leader (mandat {term})")
+            if self.on_promote is not None:
+                await self.on_promote(term)
+        elif term is None and was_leader:
+            self.term = None
+            logger.warning(f"⚠️ {self.lease.holder}: bail perdu, passage en secours")
+            if self.on_demote is not None:
+                await self.on_demote()
+        elif term is None and self.on_standby is not None:
+            await self.on_standby()
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await self.step()
+                except Exception as e:
+                    logger.error(f"Erreur élection leader: {e}")
+                await self.clock.sleep(self.renew_interval)
+        finally:
+            if self.term is not None:
+                self.lease.release()
+                logger.info(f"Bail {self.lease.name} rendu")
@@ -0,0 +1,91 @@
+"""
+Journalisation non bloquante: la boucle asyncio ne fait qu'empiler les
+enregistrements dans une file, écrite sur stdout par un thread dédié.
+Niveaux réglables par sous-système (nom de logger) et échantillonnage des
+erreurs par destinataire, regroupées par classe d'erreur.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def parse_levels(spec: str) -> dict:
+    """'broadcast=WARNING,telethon=ERROR' -> {'broadcast': 30, 'telethon': 40}"""
+    levels = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, level = item.partition('=')
+        value = logging.getLevelName(level.strip().upper())
+        if not sep or not isinstance(value, int):
+            raise ValueError(f"Niveau de log invalide: '{item}' (attendu logger=NIVEAU)")
+        levels[name.strip()] = value
+    return levels
+
+
+def setup_logging(level: str = 'INFO', subsystem_levels: str = '',
+                  stream=None) -> logging.handlers.QueueListener:
+    """
+    Remplace les handlers racine par un QueueHandler; le QueueListener
+    (thread) écrit sur `stream` et est arrêté (file vidée) à la sortie.
+    """
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper())
+    for name, value in parse_levels(subsystem_levels).items():
+        logging.getLogger(name).setLevel(value)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class ErrorSampler:
+    """
+    Erreurs d'une diffusion regroupées par classe: le compte par classe est
+    exact, seuls les `samples` premiers exemples sont conservés. Le volume
+    de log dépend du nombre de classes d'erreur, pas du nombre d'abonnés.
+    """
+
+    def __init__(self, samples: int = 3):
+        self.samples = samples
+        self.counts = {}
+        self.examples = {}
+
+    def add(self, key, error):
+        name = type(error).__name__
+        self.counts[name] = self.counts.get(name, 0) + 1
+        examples = self.examples.setdefault(name, [])
+        if len(examples) < self.samples:
+            examples.append((key, str(error)))
+
+    def extend(self, errors: dict) -> 'ErrorSampler':
+        for key, error in errors.items():
+            self.add(key, error)
+        return self
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def lines(self, context: str) -> list:
+        lines = []
+        for name, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+            examples = ', '.join(f"{key}: {message}" for key, message in self.examples[name])
+            lines.append(f"❌ {context}: {count}× {name} (ex. {examples})")
+        return lines
+
+    def log(self, log: logging.Logger, context: str, level: int = logging.ERROR):
+        for line in self.lines(context):
+            log.log(level, line)
@@ -2,33 +2,64 @@ import os
 import asyncio
 import re
 import logging
-import sys
 import json
+import socket
 from datetime import datetime, timedelta, timezone, time
-from telethon import TelegramClient, events, Button
+from telethon import TelegramClient, Button
 from telethon.sessions import StringSession
 from aiohttp import web
 from config import (
     API_ID, API_HASH, BOT_TOKEN, ADMIN_ID,
     SOURCE_CHANNEL_ID, SOURCE_CHANNEL_2_ID, PORT,
-    SUIT_MAPPING, ALL_SUITS, SUIT_DISPLAY
+    SUIT_MAPPING, ALL_SUITS, SUIT_DISPLAY,
+    BROADCAST_CONCURRENCY, BROADCAST_GLOBAL_RATE,
+    BROADCAST_PER_CHAT_INTERVAL, BROADCAST_MAX_RETRIES,
+    RECORD_STREAM, BOT_CLOCK,
+    ENGINE_STATE_FILE, ENGINE_SNAPSHOT_EVERY,
+    LOG_LEVEL, LOG_LEVELS, LOG_ERROR_SAMPLES,
+    SENDER_WORKERS, SENDER_SOCKET,
+    LEADER_LEASE_TTL, INSTANCE_ID
 )
+from clock import make_clock
+from broadcast import FloodControl, BroadcastEngine, EditPipeline
+from user_store import UserStore, WriteBehind
+from eligibility import EligibilityIndex
+from message_parser import parse_message, normalize
+from dedup import GameDedup
+from prediction_index import PendingIndex, PredictionQueue
+from game_actor import DeliveryFailed, DrainQueue, GameActor, IOQueue, SourceMessage
+from engine_state import EngineJournal
+from metrics import Registry
+from tracing import Tracer
+from log_setup import ErrorSampler, setup_logging
+from sender_pool import SenderPool
+from leader import LeaderElection, SqliteLease
+from web_cache import CachedBody
+from scheduler import DeadlineScheduler
+from dispatcher import Dispatcher
+from entity_cache import EntityCache, marked_channel_id
 
 # ============ CONSTANTES ============
 PAYMENT_LINK_500 = "https://my.moneyfusion.net/6977f7502181d4ebf722398d"   # 24h
 PAYMENT_LINK_1500 = "https://my.moneyfusion.net/6977f7502181d4ebf722398d"  # 1 semaine
 PAYMENT_LINK_2800 = "https://my.moneyfusion.net/6977f7502181d4ebf722398d"  # 2 semaines
 USERS_FILE = "users_data.json"
+USERS_DB = os.getenv('USERS_DB') or "users_data.db"
+USERS_FLUSH_INTERVAL = 0.3
+TRACE_CAPACITY = 200
+TRIAL_DURATION = timedelta(minutes=60)
+PAYMENT_TIMEOUT = timedelta(minutes=10)
+EXPIRY_SWEEP_KEY = 'expiry_sweep'
+EXPIRY_NOTICE_GRACE = timedelta(hours=24)
+EXPIRY_NOTICE_BATCH = 50
+ACCESS_FIELDS = ('registered', 'trial_started', 'trial_used', 'subscription_end')
 
 ADMIN_NAME = "Sossou Kouamé"
 ADMIN_TITLE = "Administrateur et développeur de ce Bot"
 
 # ============ CONFIGURATION ============
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+# Écriture des logs hors de la boucle asyncio (thread dédié)
+setup_logging(LOG_LEVEL, LOG_LEVELS)
 logger = logging.getLogger(__name__)
 
 if not API_ID or API_ID == 0:
@@ -46,10 +77,48 @@ logger.info(f"Configuration: SOURCE_CHANNEL={SOURCE_CHANNEL_ID}, SOURCE_CHANNEL_
 session_string = os.getenv('TELEGRAM_SESSION', '')
 client = TelegramClient(StringSession(session_string), API_ID, API_HASH)
 
+# Horloge unique des chemins temporels (remplaçable par SimulatedClock en test)
+clock = make_clock(BOT_CLOCK)
+
+flood_control = FloodControl(BROADCAST_GLOBAL_RATE, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL, clock=clock)
+broadcast_engine = BroadcastEngine(flood_control, BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES)
+edit_pipeline = EditPipeline(
+    broadcast_engine,
+    lambda user_id, msg_id, text: client.edit_message(user_id, msg_id, text),
+    on_report=lambda game_number, report: record_edit_report(game_number, report)
+)
+# Processus d'envoi partitionnés (optionnel); les éditions restent dans ce processus
+sender_pool = SenderPool(SENDER_WORKERS, clock, SENDER_SOCKET or None) if SENDER_WORKERS > 0 else None
+
+def set_clock(new_clock):
+    """Remplace l'horloge partout (tests, relecture, bancs d'essai)."""
+    global clock
+    clock = new_clock
+    flood_control.clock = new_clock
+    if sender_pool is not None:
+        sender_pool.clock = new_clock
+    tracer.clock = new_clock
+    deadline_scheduler.clock = new_clock
+    entity_cache.clock = new_clock
+    if leader_election is not None:
+        leader_election.clock = new_clock
+
 # ============ VARIABLES GLOBALES ============
-pending_predictions = {}
-queued_predictions = {}
-processed_messages = set()
+pending_predictions = PendingIndex()
+queued_predictions = PredictionQueue()
+processed_messages = GameDedup(window=50)
+# Seul game_actor modifie l'état de jeu; les envois/éditions passent par io_queue
+game_actor = GameActor()
+io_queue = IOQueue()
+engine_journal = None
+tracer = Tracer(clock, TRACE_CAPACITY)
+deadline_scheduler = DeadlineScheduler(clock)
+# Mode actif/secours (LEADER_LEASE_TTL > 0): créé dans main()
+leader_election = None
+leader_tasks = []
+standby_state_mark = None
+# Faux entre la promotion et la fin de la reprise de l'état (take_over_engine)
+engine_ready = True
 current_game_number = 0
 last_source_game_number = 0
 suit_prediction_counts = {}
@@ -58,7 +127,7 @@ USER_A = 1
 SUIT_CYCLE = ['♥', '♦', '♣', '♠', '♦', '♥', '♠', '♣']
 TIME_CYCLE = [5, 8, 3, 7, 9, 4, 6, 8, 3, 5, 9, 7, 4, 6, 8, 3, 5, 9, 7, 4, 6, 8, 3, 5, 9, 7, 4, 6, 8, 5]
 current_time_cycle_index = 0
-next_prediction_allowed_at = datetime.now()
+next_prediction_allowed_at = clock.now()
 
 last_known_source_game = 0
 prediction_target_game = None
@@ -70,6 +139,10 @@ MAX_RULE1_CONSECUTIVE = 3
 
 rule2_active = False
 
+# Numéro de la dernière prédiction lancée; tâches d'envoi en cours par jeu (/predict)
+prediction_sequence = 0
+delivery_tasks = {}
+
 stats_bilan = {
     'total': 0,
     'wins': 0,
@@ -78,31 +151,104 @@ stats_bilan = {
     'loss_details': {'❌': 0}
 }
 
+entity_cache = EntityCache(ttl=600, clock=clock)
+
 users_data = {}
+user_store = None
+users_writer = None
+eligibility_index = EligibilityIndex()
 user_conversation_state = {}
 admin_message_state = {}
 admin_predict_state = {}
 pending_screenshots = {}
 
+# ============ MÉTRIQUES ============
+metrics = Registry(prefix='bot_')
+SOURCE_TO_BROADCAST = metrics.histogram(
+    'source_to_first_delivery_seconds', "Réception du message source -> premier utilisateur servi")
+SOURCE_TO_LAST_DELIVERY = metrics.histogram(
+    'source_to_last_delivery_seconds', "Réception du message source -> dernier utilisateur servi")
+BROADCAST_DURATION = metrics.histogram('broadcast_duration_seconds', "Durée d'une diffusion de prédiction")
+BROADCAST_MESSAGES = metrics.counter('broadcast_messages_total', "Messages de prédiction par résultat")
+EDIT_DURATION = metrics.histogram('edit_duration_seconds', "Durée d'une édition de statut (tous utilisateurs)")
+EDIT_MESSAGES = metrics.counter('edit_messages_total', "Éditions de statut par résultat")
+FLOOD_WAITS = metrics.counter('flood_waits_total', "FloodWait reçus de Telegram")
+FLOOD_WAIT_SECONDS = metrics.counter('flood_wait_seconds_total', "Secondes de FloodWait imposées")
+USERS_WRITE_DURATION = metrics.histogram(
+    'users_write_seconds', "Durée d'une écriture groupée des utilisateurs",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+USERS_WRITTEN = metrics.counter('users_written_total', "Utilisateurs écrits en base")
+metrics.gauge('queued_predictions', "Prédictions en file d'attente", lambda: len(queued_predictions))
+metrics.gauge('pending_predictions', "Prédictions en cours", lambda: len(pending_predictions))
+metrics.gauge('users', "Utilisateurs enregistrés (users_data)", lambda: len(users_data))
+metrics.gauge('eligible_users', "Utilisateurs éligibles aux prédictions",
+              lambda: len(eligibility_index))
+metrics.gauge('users_write_pending', "Utilisateurs en attente d'écriture",
+              lambda: users_writer.pending if users_writer is not None else 0)
+metrics.gauge('current_game', "Dernier numéro de jeu finalisé", lambda: current_game_number)
+metrics.gauge('actor_queue_depth', "Événements en attente dans l'acteur de jeu", lambda: game_actor.depth)
+metrics.gauge('io_commands_pending', "Envois/éditions en cours", lambda: io_queue.pending)
+metrics.gauge('scheduled_deadlines', "Échéances planifiées (timeouts, expirations)", lambda: len(deadline_scheduler))
+metrics.gauge('leader', "1 si cette instance détient le bail leader", lambda: int(is_leader()))
+metrics.gauge('sender_workers_connected', "Processus d'envoi connectés",
+              lambda: sender_pool.connected if sender_pool is not None else 0)
+
+def record_users_flush(count: int, seconds: float):
+    USERS_WRITE_DURATION.observe(seconds)
+    USERS_WRITTEN.inc(count)
+
+def record_broadcast_report(report, histogram, counter):
+    histogram.observe(report.duration)
+    counter.inc(report.sent, result='sent')
+    counter.inc(report.failed, result='failed')
+    FLOOD_WAITS.inc(report.flood_waits)
+    FLOOD_WAIT_SECONDS.inc(report.flood_wait_seconds)
+
+def record_edit_report(game_number: int, report):
+    """Une fois par édition exécutée par edit_pipeline (pas par appel coalescé)."""
+    record_broadcast_report(report, EDIT_DURATION, EDIT_MESSAGES)
+    ErrorSampler(LOG_ERROR_SAMPLES).extend(report.errors).log(logger, f"Édition #{game_number}")
+
 # ============ FONCTIONS UTILISATEURS ============
 def load_users_data():
-    global users_data
+    """Charge les utilisateurs; une base illisible est fatale plutôt que de repartir à vide."""
+    global users_data, user_store, users_writer
     try:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                users_data = json.load(f)
-            logger.info(f"Données utilisateurs chargées: {len(users_data)} utilisateurs")
+        if user_store is None:
+            user_store = UserStore(USERS_DB)
+            user_store.import_json(USERS_FILE)
+            users_writer = WriteBehind(user_store, USERS_FLUSH_INTERVAL, on_flush=record_users_flush)
+            deadline_scheduler.attach(user_store)
+        users_data = user_store.load_all()
+        rebuild_eligibility_index()
+        logger.info(f"Données utilisateurs chargées: {len(users_data)} utilisateurs")
     except Exception as e:
         logger.error(f"Erreur chargement users_data: {e}")
-        users_data = {}
+        raise
+
+def save_user(user_id_str: str):
+    """Marque un utilisateur à persister (écriture différée groupée)."""
+    if users_writer is not None:
+        users_writer.mark(user_id_str, users_data[user_id_str])
 
 def save_users_data():
+    """Resynchronise toute la base (utilisé par /reset)."""
+    if user_store is None:
+        return
+    rebuild_eligibility_index()
     try:
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users_data, f, ensure_ascii=False, indent=2)
+        users_writer.discard()
+        user_store.replace_all(users_data)
     except Exception as e:
         logger.error(f"Erreur sauvegarde users_data: {e}")
 
+async def flush_users_data():
+    """Écrit immédiatement les modifications en attente (arrêt du bot)."""
+    if users_writer is not None:
+        count = await users_writer.flush()
+        if count:
+            logger.info(f"💾 {count} utilisateurs écrits avant arrêt")
+
 def get_user(user_id: int) -> dict:
     user_id_str = str(user_id)
     if user_id_str not in users_data:
@@ -119,7 +265,7 @@ def get_user(user_id: int) -> dict:
             'awaiting_screenshot': False,
             'awaiting_amount': False
         }
-        save_users_data()
+        save_user(user_id_str)
     return users_data[user_id_str]
 
 def update_user(user_id: int, data: dict):
@@ -127,7 +273,46 @@ def update_user(user_id: int, data: dict):
     if user_id_str not in users_data:
         get_user(user_id)
     users_data[user_id_str].update(data)
-    save_users_data()
+    save_user(user_id_str)
+    if any(key in data for key in ACCESS_FIELDS):
+        refresh_eligibility(user_id_str)
+
+# ============ INDEX ÉLIGIBILITÉ ============
+def compute_access_expiry(user: dict):
+    """Fin d'accès (abonnement ou essai) d'un utilisateur, None s'il n'a aucun accès."""
+    if not user.get('registered'):
+        return None
+    ends = []
+    if user.get('subscription_end'):
+        try:
+            ends.append(datetime.fromisoformat(user['subscription_end']))
+        except ValueError:
+            pass
+    if user.get('trial_started') and not user.get('trial_used'):
+        try:
+            ends.append(datetime.fromisoformat(user['trial_started']) + TRIAL_DURATION)
+        except ValueError:
+            pass
+    return max(ends).timestamp() if ends else None
+
+def refresh_eligibility(user_id_str: str):
+    user = users_data.get(user_id_str)
+    eligibility_index.update(user_id_str, compute_access_expiry(user) if user else None)
+    schedule_expiry_sweep()
+
+def rebuild_eligibility_index():
+    eligibility_index.clear()
+    for user_id_str, user in users_data.items():
+        eligibility_index.update(user_id_str, compute_access_expiry(user))
+    schedule_expiry_sweep()
+
+def schedule_expiry_sweep():
+    """(Re)planifie le balayage des expirations à la prochaine fin d'accès de l'index."""
+    due = eligibility_index.next_expiry()
+    if due is None:
+        deadline_scheduler.cancel(EXPIRY_SWEEP_KEY)
+    elif deadline_scheduler.due_of(EXPIRY_SWEEP_KEY) != due:
+        deadline_scheduler.schedule(EXPIRY_SWEEP_KEY, due, 'expiry_sweep')
 
 def is_user_subscribed(user_id: int) -> bool:
     if user_id == ADMIN_ID:
@@ -137,7 +322,7 @@ def is_user_subscribed(user_id: int) -> bool:
         return False
     try:
         sub_end = datetime.fromisoformat(user['subscription_end'])
-        return datetime.now() < sub_end
+        return clock.now() < sub_end
     except:
         return False
 
@@ -147,24 +332,14 @@ def is_trial_active(user_id: int) -> bool:
         return False
     try:
         trial_start = datetime.fromisoformat(user['trial_started'])
-        trial_end = trial_start + timedelta(minutes=60)
-        return datetime.now() < trial_end
+        trial_end = trial_start + TRIAL_DURATION
+        return clock.now() < trial_end
     except:
         return False
 
 def can_receive_predictions(user_id: int) -> bool:
-    """VÉRIFICATION CRITIQUE: Abonné OU Essai actif"""
-    user = get_user(user_id)
-    if not user.get('registered'):
-        logger.debug(f"User {user_id} non enregistré")
-        return False
-    
-    subscribed = is_user_subscribed(user_id)
-    trial = is_trial_active(user_id)
-    
-    logger.info(f"User {user_id}: subscribed={subscribed}, trial={trial}")
-    
-    return subscribed or trial
+    """VÉRIFICATION CRITIQUE: Abonné OU Essai actif (lecture de l'index, O(1))"""
+    return eligibility_index.is_eligible(str(user_id), clock.now().timestamp())
 
 def get_subscription_type(user_id: int) -> str:
     user = get_user(user_id)
@@ -182,19 +357,24 @@ def get_user_status(user_id: int) -> str:
 
 # ============ FONCTIONS CALCUL COSTUME ET SIGNATURE ============
 def get_suit_for_number(n: int) -> str:
-    """Calcule le costume pour un numéro donné basé sur SUIT_CYCLE"""
+    """
+    Calcule le costume pour un numéro donné basé sur SUIT_CYCLE, en O(1).
+    Nombre de pairs valides dans [6, n]: avec m = n // 2, les pairs 6..2m
+    sont m - 2 et les multiples de 10 parmi eux m // 5, d'où
+    count_valid = m - 2 - m // 5 (identique à l'ancien parcours range(6, n+1, 2)).
+    """
     if n < 6:
         return '♥'
-    
-    count_valid = 0
-    for i in range(6, n + 1, 2):
-        if i % 10 != 0:
-            count_valid += 1
-    
+    m = n // 2
+    count_valid = m - 2 - m // 5
     if count_valid > 0:
         return SUIT_CYCLE[(count_valid - 1) % 8]
     return '♥'
 
+def get_suits_for_numbers(numbers) -> list:
+    """Version groupée de get_suit_for_number."""
+    return [get_suit_for_number(n) for n in numbers]
+
 def calculate_signature(target_game: int, current_index: int) -> tuple:
     """
     Calcule la signature: prochain numéro à prédire, son costume, et le temps d'attente
@@ -223,65 +403,71 @@ def calculate_signature(target_game: int, current_index: int) -> tuple:
     return candidate, next_suit, wait_min, next_index
 
 # ============ FONCTIONS ENVOI PRÉDICTIONS ============
-async def send_prediction_to_all_users(prediction_msg: str, target_game: int, rule_type: str = "R2"):
+async def send_prediction_to_all_users(prediction_msg: str, target_game: int, rule_type: str = "R2",
+                                       trace=None):
     """
     ENVOI CRITIQUE: Prédiction à tous les utilisateurs éligibles (abonnés ou essai)
+    Envoi concurrent via broadcast_engine (limites anti-flood respectées).
+    trace: trace du message source à l'origine de la prédiction (latences).
     """
-    private_messages = {}
-    sent_count = 0
-    failed_count = 0
-    skipped_count = 0
+    bot_id_str = BOT_TOKEN.split(':')[0]
     
     logger.info(f"📤 DÉBUT ENVOI prédiction #{target_game} ({rule_type})")
     
-    # Envoyer à l'admin aussi
-    try:
-        if ADMIN_ID and ADMIN_ID != 0:
-            admin_msg = await client.send_message(ADMIN_ID, prediction_msg)
-            private_messages[str(ADMIN_ID)] = admin_msg.id
-            logger.info(f"✅ Admin {ADMIN_ID}: envoyé")
-        else:
-            logger.warning("Admin ID non configuré")
-    except Exception as e:
-        logger.error(f"❌ Erreur envoi admin: {e}")
-        failed_count += 1
-    
-    # Envoyer à tous les utilisateurs
-    logger.info(f"👥 Total utilisateurs: {len(users_data)}")
-    
-    for user_id_str, user_info in users_data.items():
-        try:
-            user_id = int(user_id_str)
-            
-            # Skip admin (déjà envoyé)
-            if user_id == ADMIN_ID:
-                continue
-            
-            # Skip bot token
-            if user_id_str == BOT_TOKEN.split(':')[0]:
-                continue
-            
-            # VÉRIFICATION ÉLIGIBILITÉ
-            if not can_receive_predictions(user_id):
-                logger.debug(f"⏭️ User {user_id}: non éligible (pas abonné ni essai)")
-                skipped_count += 1
-                continue
-            
-            # ENVOI DU MESSAGE
-            sent_msg = await client.send_message(user_id, prediction_msg)
-            private_messages[user_id_str] = sent_msg.id
-            sent_count += 1
-            logger.info(f"✅ User {user_id}: envoyé (msg_id: {sent_msg.id})")
-            
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"❌ Erreur envoi user {user_id_str}: {e}")
-    
-    logger.info(f"📊 RÉSULTAT ENVOI #{target_game}: {sent_count} envoyés, {skipped_count} ignorés, {failed_count} échecs")
+    # L'admin en premier dans la file
+    recipients = []
+    if ADMIN_ID and ADMIN_ID != 0:
+        recipients.append(ADMIN_ID)
+    else:
+        logger.warning("Admin ID non configuré")
+    
+    # Destinataires lus depuis l'index d'éligibilité (expirés retirés par le balayage)
+    eligible_ids = eligibility_index.members()
+    skipped_count = len(users_data) - len(eligible_ids)
+    logger.info(f"👥 Total utilisateurs: {len(users_data)} | Éligibles: {len(eligible_ids)}")
+    
+    for user_id_str in eligible_ids:
+        # Skip admin (déjà en file) et bot token
+        if user_id_str == str(ADMIN_ID) or user_id_str == bot_id_str:
+            continue
+        recipients.append(int(user_id_str))
+    
+    async def send_one(user_id):
+        sent_msg = await client.send_message(user_id, prediction_msg)
+        return sent_msg.id
+    
+    if sender_pool is not None:
+        report = await sender_pool.broadcast(
+            recipients, prediction_msg,
+            fallback=lambda user_ids: broadcast_engine.run(user_ids, send_one)
+        )
+    else:
+        report = await broadcast_engine.run(recipients, send_one)
+    
+    private_messages = {str(uid): msg_id for uid, msg_id in report.results.items()}
+    ErrorSampler(LOG_ERROR_SAMPLES).extend(report.errors).log(logger, f"Envoi #{target_game}")
+    
+    record_broadcast_report(report, BROADCAST_DURATION, BROADCAST_MESSAGES)
+    BROADCAST_MESSAGES.inc(skipped_count, result='skipped')
+    if trace is not None:
+        trace.mark('broadcast', report.started_at)
+        if report.first_at is not None:
+            trace.mark('first_delivery', report.first_at)
+            trace.mark('last_delivery', report.last_at)
+            SOURCE_TO_BROADCAST.observe(report.first_at - trace.marks['received'])
+            SOURCE_TO_LAST_DELIVERY.observe(report.last_at - trace.marks['received'])
+        tracer.finish(trace)
+    
+    logger.info(
+        f"📊 RÉSULTAT ENVOI #{target_game}: {report.sent} envoyés, {skipped_count} ignorés, "
+        f"{report.failed} échecs | 1er: {report.time_to_first:.2f}s, dernier: {report.time_to_last:.2f}s, "
+        f"FloodWait: {report.flood_waits} ({report.flood_wait_seconds:.0f}s)"
+    )
     return private_messages
 
-async def edit_prediction_for_all_users(game_number: int, new_status: str, suit: str, rule_type: str, original_game: int = None):
-    """Édite les messages de prédiction pour TOUS les utilisateurs."""
+async def edit_prediction_for_all_users(game_number: int, new_status: str, suit: str, rule_type: str,
+                                        original_game: int = None, private_msgs: dict = None):
+    """Édite les messages de prédiction pour TOUS les utilisateurs (en parallèle, via edit_pipeline)."""
     display_game = original_game if original_game else game_number
     
     if rule_type == "R2":
@@ -315,67 +501,45 @@ async def edit_prediction_for_all_users(game_number: int, new_status: str, suit:
 📊 Statut: {status_text}
 🤖 Algorithme: Règle 1 (Cycle)"""
 
-    if game_number not in pending_predictions:
-        logger.warning(f"Jeu #{game_number} non trouvé pour édition")
-        return 0
-    
-    pred = pending_predictions[game_number]
-    private_msgs = pred.get('private_messages', {})
+    if private_msgs is None:
+        if game_number not in pending_predictions:
+            logger.warning(f"Jeu #{game_number} non trouvé pour édition")
+            return 0
+        private_msgs = pending_predictions[game_number].get('private_messages', {})
     
     if not private_msgs:
         logger.warning(f"Aucun message privé pour #{game_number}")
         return 0
     
-    edited_count = 0
-    failed_count = 0
-    
-    for user_id_str, msg_id in list(private_msgs.items()):
-        try:
-            user_id = int(user_id_str)
-            await client.edit_message(user_id, msg_id, updated_msg)
-            edited_count += 1
-            logger.info(f"✅ Édité pour {user_id}: {new_status}")
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"❌ Erreur édition {user_id_str}: {e}")
-            if "message to edit not found" in str(e).lower():
-                del private_msgs[user_id_str]
+    # Édition parallèle; un statut plus récent pour le même jeu est coalescé
+    messages = {int(uid): msg_id for uid, msg_id in private_msgs.items()}
+    report = await edit_pipeline.submit(game_number, messages, updated_msg)
+    for user_id, err in report.errors.items():
+        if "message to edit not found" in str(err).lower():
+            private_msgs.pop(str(user_id), None)
     
-    logger.info(f"📊 Édition #{game_number}: {edited_count} succès, {failed_count} échecs")
-    return edited_count
+    logger.info(
+        f"📊 Édition #{game_number} ({new_status}): {report.sent} succès, {report.failed} échecs "
+        f"en {report.duration:.2f}s"
+    )
+    return report.sent
 
 # ============ FONCTIONS ANALYSE ============
 def extract_game_number(message: str):
     """Extrait le numéro de jeu du message."""
-    match = re.search(r"#N\s*(\d+)", message, re.IGNORECASE)
-    if match:
-        return int(match.group(1))
-    return None
+    return parse_message(message).game_number
 
 def parse_stats_message(message: str):
     """Extrait les statistiques du canal source 2."""
-    stats = {}
-    patterns = {
-        '♠': r'♠️?\s*:\s*(\d+)',
-        '♥': r'♥️?\s*:\s*(\d+)',
-        '♦': r'♦️?\s*:\s*(\d+)',
-        '♣': r'♣️?\s*:\s*(\d+)'
-    }
-    for suit, pattern in patterns.items():
-        match = re.search(pattern, message)
-        if match:
-            stats[suit] = int(match.group(1))
-    return stats
+    return dict(parse_message(message).stats)
 
 def extract_parentheses_groups(message: str):
     """Extrait le contenu entre parenthèses."""
-    return re.findall(r"\(([^)]*)\)", message)
+    return list(parse_message(message).groups)
 
 def normalize_suits(group_str: str) -> str:
     """Remplace les différentes variantes de symboles."""
-    normalized = group_str.replace('❤️', '♥').replace('❤', '♥').replace('♥️', '♥')
-    normalized = normalized.replace('♠️', '♠').replace('♦️', '♦').replace('♣️', '♣')
-    return normalized
+    return normalize(group_str)
 
 def has_suit_in_group(group_str: str, target_suit: str) -> bool:
     """Vérifie si le costume cible est présent dans le groupe."""
@@ -398,15 +562,19 @@ def is_one_part_away(current: int, target: int) -> bool:
 # ============ LOGIQUE PRÉDICTION ET FILE D'ATTENTE ============
 async def send_prediction_to_users(target_game: int, predicted_suit: str, base_game: int, 
                                      rattrapage=0, original_game=None, rule_type="R2"):
-    """Envoie la prédiction avec SIGNATURE."""
-    global rule2_active, rule1_consecutive_count, current_time_cycle_index
+    """
+    Envoie la prédiction avec SIGNATURE. La diffusion s'exécute dans la file
+    d'E/S: si elle n'atteint personne, DeliveryFailed retire la prédiction.
+    """
+    global rule2_active, rule1_consecutive_count, current_time_cycle_index, prediction_sequence
     
     try:
         # Mode rattrapage
         if rattrapage > 0:
             original_private_msgs = {}
             if original_game and original_game in pending_predictions:
-                original_private_msgs = pending_predictions[original_game].get('private_messages', {}).copy()
+                # Même dict que l'original: rempli par sa diffusion, peut-être encore en cours
+                original_private_msgs = pending_predictions[original_game].setdefault('private_messages', {})
                 logger.info(f"Rattrapage {rattrapage}: récupération {len(original_private_msgs)} msgs de #{original_game}")
             
             pending_predictions[target_game] = {
@@ -418,7 +586,7 @@ async def send_prediction_to_users(target_game: int, predicted_suit: str, base_g
                 'original_game': original_game,
                 'rule_type': rule_type,
                 'private_messages': original_private_msgs,
-                'created_at': datetime.now().isoformat()
+                'created_at': clock.now().isoformat()
             }
             
             if rule_type == "R2":
@@ -428,10 +596,7 @@ async def send_prediction_to_users(target_game: int, predicted_suit: str, base_g
 
         # Vérifier blocage R2 pour R1
         if rule_type == "R1":
-            active_r2_predictions = [p for game, p in pending_predictions.items() 
-                                    if p.get('rule_type') == 'R2' and p.get('rattrapage', 0) == 0 
-                                    and game > current_game_number]
-            if active_r2_predictions:
+            if pending_predictions.has_primary_after('R2', current_game_number):
                 logger.info(f"Règle 2 active, R1 bloquée pour #{target_game}")
                 return False
         
@@ -447,14 +612,24 @@ async def send_prediction_to_users(target_game: int, predicted_suit: str, base_g
 
         logger.info(f"📨 Message préparé pour #{target_game}:\n{prediction_msg}")
 
-        # ENVOI À TOUS LES UTILISATEURS ÉLIGIBLES
-        private_messages = await send_prediction_to_all_users(prediction_msg, target_game, rule_type)
-        
-        if not private_messages:
-            logger.error(f"❌ ÉCHEC ENVOI #{target_game}: aucun destinataire")
-            return False
+        # État R1/R2 rétabli par on_delivery_failed si la diffusion n'atteint personne
+        prediction_sequence += 1
+        previous = {
+            'rule2_active': rule2_active,
+            'rule1_consecutive_count': rule1_consecutive_count,
+            'current_time_cycle_index': current_time_cycle_index,
+            'next_prediction_allowed_at': next_prediction_allowed_at,
+        }
 
-        logger.info(f"✅ SUCCÈS ENVOI #{target_game}: {len(private_messages)} destinataires")
+        # ENVOI À TOUS LES UTILISATEURS ÉLIGIBLES (file d'E/S, remplit private_messages)
+        private_messages = {}
+        trace = tracer.fork_current(target_game, rule_type)
+        if trace is not None:
+            trace.mark('send', clock.monotonic())
+        task = io_queue.submit(target_game, deliver_prediction, prediction_msg, target_game, rule_type,
+                               private_messages, trace, prediction_sequence, previous)
+        delivery_tasks[target_game] = task
+        task.add_done_callback(lambda t: forget_delivery(target_game, t))
 
         # Stockage de la prédiction
         pending_predictions[target_game] = {
@@ -466,7 +641,7 @@ async def send_prediction_to_users(target_game: int, predicted_suit: str, base_g
             'rattrapage': 0,
             'rule_type': rule_type,
             'private_messages': private_messages,
-            'created_at': datetime.now().isoformat()
+            'created_at': clock.now().isoformat()
         }
 
         # Mise à jour des flags
@@ -487,6 +662,53 @@ async def send_prediction_to_users(target_game: int, predicted_suit: str, base_g
         logger.error(traceback.format_exc())
         return False
 
+def forget_delivery(target_game: int, task):
+    if delivery_tasks.get(target_game) is task:
+        del delivery_tasks[target_game]
+
+async def deliver_prediction(prediction_msg: str, target_game: int, rule_type: str, private_messages: dict,
+                             trace=None, sequence: int = 0, previous: dict = None) -> int:
+    """Commande d'E/S: diffuse la prédiction puis enregistre les message_id par utilisateur."""
+    sent = await send_prediction_to_all_users(prediction_msg, target_game, rule_type, trace=trace)
+    if not sent:
+        logger.error(f"❌ ÉCHEC ENVOI #{target_game}: aucun destinataire")
+        game_actor.post(DeliveryFailed(target_game, sequence, previous or {}))
+        return 0
+    private_messages.update(sent)
+    if engine_journal is not None:
+        engine_journal.record_messages(str(target_game), sent)
+    logger.info(f"✅ SUCCÈS ENVOI #{target_game}: {len(sent)} destinataires")
+    return len(sent)
+
+@game_actor.on(DeliveryFailed)
+async def on_delivery_failed(event: DeliveryFailed):
+    """
+    Prédiction diffusée à personne: elle est retirée (ni édition ni résultat
+    attendus). L'état R1/R2 n'est rétabli que si aucune autre prédiction n'a
+    été lancée depuis; sinon seule une R2 orpheline est désactivée.
+    """
+    global rule2_active, rule1_consecutive_count, current_time_cycle_index, next_prediction_allowed_at
+    pred = pending_predictions.get(event.game)
+    if pred is None or pred.get('rattrapage', 0) > 0 or pred.get('private_messages'):
+        return
+    del pending_predictions[event.game]
+    for game in [g for g, p in pending_predictions.items() if p.get('original_game') == event.game]:
+        del pending_predictions[game]
+    for game in [g for g, q in queued_predictions.items() if q.get('original_game') == event.game]:
+        del queued_predictions[game]
+
+    if event.sequence == prediction_sequence and event.previous:
+        rule2_active = event.previous['rule2_active']
+        rule1_consecutive_count = event.previous['rule1_consecutive_count']
+        current_time_cycle_index = event.previous['current_time_cycle_index']
+        next_prediction_allowed_at = event.previous['next_prediction_allowed_at']
+        logger.warning(f"↩️ #{event.game} non diffusée: état R1/R2 rétabli")
+    elif pred.get('rule_type') == 'R2' and not pending_predictions.has_primary_after('R2', current_game_number):
+        rule2_active = False
+        logger.warning(f"↩️ #{event.game} non diffusée: R2 désactivée")
+    else:
+        logger.warning(f"↩️ #{event.game} non diffusée: prédiction retirée")
+
 def queue_prediction(target_game: int, predicted_suit: str, base_game: int, 
                     rattrapage=0, original_game=None, rule_type="R2"):
     """Met une prédiction en file d'attente."""
@@ -506,8 +728,9 @@ def queue_prediction(target_game: int, predicted_suit: str, base_game: int,
         'rattrapage': rattrapage,
         'original_game': original_game,
         'rule_type': rule_type,
-        'queued_at': datetime.now().isoformat()
+        'queued_at': clock.now().isoformat()
     }
+    tracer.mark('queued')
     logger.info(f"📋 File d'attente: #{target_game} ({rule_type}, R{rattrapage})")
     return True
 
@@ -516,19 +739,18 @@ async def check_and_send_queued_predictions(current_game: int):
     global current_game_number, rule2_active
     current_game_number = current_game
 
-    sorted_queued = sorted(queued_predictions.keys())
-
-    for target_game in list(sorted_queued):
-        if target_game >= current_game:
-            pred_data = queued_predictions.pop(target_game)
-            await send_prediction_to_users(
-                pred_data['target_game'],
-                pred_data['predicted_suit'],
-                pred_data['base_game'],
-                pred_data.get('rattrapage', 0),
-                pred_data.get('original_game'),
-                pred_data.get('rule_type', 'R2')
-            )
+    for target_game in queued_predictions.ready(current_game):
+        pred_data = queued_predictions.pop(target_game, None)
+        if pred_data is None:
+            continue
+        await send_prediction_to_users(
+            pred_data['target_game'],
+            pred_data['predicted_suit'],
+            pred_data['base_game'],
+            pred_data.get('rattrapage', 0),
+            pred_data.get('original_game'),
+            pred_data.get('rule_type', 'R2')
+        )
 
 async def update_prediction_status(game_number: int, new_status: str):
     """Met à jour le statut et édite tous les messages."""
@@ -547,8 +769,10 @@ async def update_prediction_status(game_number: int, new_status: str):
 
         logger.info(f"Mise à jour #{game_number} [{rule_type}] → {new_status}")
 
-        # Édition des messages
-        await edit_prediction_for_all_users(game_number, new_status, suit, rule_type, original_game)
+        # Édition des messages (file d'E/S, après l'envoi initial du jeu d'origine, dont
+        # le dict private_messages est partagé avec ses rattrapages et lu à l'édition)
+        io_queue.submit_after(original_game, edit_prediction_for_all_users, game_number, new_status, suit,
+                              rule_type, original_game, pred.setdefault('private_messages', {}))
 
         pred['status'] = new_status
         
@@ -567,7 +791,7 @@ async def update_prediction_status(game_number: int, new_status: str):
                 rule1_consecutive_count = 0
                 
             del pending_predictions[game_number]
-            asyncio.create_task(check_and_send_queued_predictions(current_game_number))
+            game_actor.post(DrainQueue(current_game_number))
             
         elif new_status == '❌':
             stats_bilan['total'] += 1
@@ -584,7 +808,7 @@ async def update_prediction_status(game_number: int, new_status: str):
                 
             if game_number in pending_predictions:
                 del pending_predictions[game_number]
-            asyncio.create_task(check_and_send_queued_predictions(current_game_number))
+            game_actor.post(DrainQueue(current_game_number))
 
         return True
         
@@ -615,44 +839,45 @@ async def check_prediction_result(game_number: int, first_group: str):
                 logger.info(f"Échec #{game_number}, rattrapage #{next_target}")
 
     # Vérification rattrapages
-    for target_game, pred in list(pending_predictions.items()):
-        if target_game == game_number and pred.get('rattrapage', 0) > 0:
-            original_game = pred.get('original_game', target_game - pred['rattrapage'])
-            target_suit = pred['suit']
-            rattrapage_actuel = pred['rattrapage']
-            rule_type = pred.get('rule_type', 'R2')
-            
-            if has_suit_in_group(first_group, target_suit):
-                status_map = {1: '✅1️⃣', 2: '✅2️⃣', 3: '✅3️⃣'}
-                status_code = status_map.get(rattrapage_actuel, f'✅{rattrapage_actuel}️⃣')
-                logger.info(f"{status_code} #{original_game} au rattrapage {rattrapage_actuel}!")
-                await update_prediction_status(original_game, status_code)
-                if target_game != original_game and target_game in pending_predictions:
+    pred = pending_predictions.get(game_number)
+    if pred is not None and pred.get('rattrapage', 0) > 0:
+        target_game = game_number
+        original_game = pred.get('original_game', target_game - pred['rattrapage'])
+        target_suit = pred['suit']
+        rattrapage_actuel = pred['rattrapage']
+        rule_type = pred.get('rule_type', 'R2')
+        
+        if has_suit_in_group(first_group, target_suit):
+            status_map = {1: '✅1️⃣', 2: '✅2️⃣', 3: '✅3️⃣'}
+            status_code = status_map.get(rattrapage_actuel, f'✅{rattrapage_actuel}️⃣')
+            logger.info(f"{status_code} #{original_game} au rattrapage {rattrapage_actuel}!")
+            await update_prediction_status(original_game, status_code)
+            if target_game != original_game and target_game in pending_predictions:
+                del pending_predictions[target_game]
+            return
+        else:
+            if rattrapage_actuel < 3:
+                next_rattrapage = rattrapage_actuel + 1
+                next_target = game_number + 1
+                queue_prediction(next_target, target_suit, pred['base_game'], 
+                               rattrapage=next_rattrapage, original_game=original_game,
+                               rule_type=rule_type)
+                logger.info(f"Échec rattrapage {rattrapage_actuel}, planifié {next_rattrapage}")
+                if target_game in pending_predictions:
                     del pending_predictions[target_game]
-                return
             else:
-                if rattrapage_actuel < 3:
-                    next_rattrapage = rattrapage_actuel + 1
-                    next_target = game_number + 1
-                    queue_prediction(next_target, target_suit, pred['base_game'], 
-                                   rattrapage=next_rattrapage, original_game=original_game,
-                                   rule_type=rule_type)
-                    logger.info(f"Échec rattrapage {rattrapage_actuel}, planifié {next_rattrapage}")
-                    if target_game in pending_predictions:
-                        del pending_predictions[target_game]
-                else:
-                    logger.info(f"❌ #{original_game} définitif après 3 rattrapages")
-                    await update_prediction_status(original_game, '❌')
-                    if target_game != original_game and target_game in pending_predictions:
-                        del pending_predictions[target_game]
-                return
+                logger.info(f"❌ #{original_game} définitif après 3 rattrapages")
+                await update_prediction_status(original_game, '❌')
+                if target_game != original_game and target_game in pending_predictions:
+                    del pending_predictions[target_game]
+            return
 
 # ============ RÈGLE 2 ============
 async def process_stats_message(message_text: str):
     """Traite les statistiques du canal 2."""
     global last_source_game_number, suit_prediction_counts, rule2_active
     
-    stats = parse_stats_message(message_text)
+    stats = parse_message(message_text).stats
     if not stats:
         return False
 
@@ -672,6 +897,7 @@ async def process_stats_message(message_text: str):
                     continue
 
                 logger.info(f"R2 DÉCLENCHÉE: décalage {diff} entre {s1}({v1}) et {s2}({v2})")
+                tracer.mark('rule')
                 
                 if last_source_game_number > 0:
                     target_game = last_source_game_number + USER_A
@@ -713,6 +939,8 @@ async def try_launch_prediction_rule1():
         logger.info(f"R1: '1 part' OK {last_known_source_game} → {prediction_target_game}")
         
         predicted_suit = get_suit_for_number(prediction_target_game)
+        # Décision prise: la trace est copiée par send_prediction_to_users
+        tracer.mark('rule')
         
         success = await send_prediction_to_users(
             prediction_target_game, 
@@ -726,7 +954,7 @@ async def try_launch_prediction_rule1():
             cycle_triggered = False
             prediction_target_game = None
             
-            next_prediction_allowed_at = datetime.now() + timedelta(minutes=TIME_CYCLE[current_time_cycle_index])
+            next_prediction_allowed_at = clock.now() + timedelta(minutes=TIME_CYCLE[current_time_cycle_index])
             logger.info(f"R1: prochaine autorisée dans {TIME_CYCLE[current_time_cycle_index]} min")
             return True
     else:
@@ -739,12 +967,12 @@ async def process_prediction_logic_rule1(message_text: str, chat_id: int):
     global last_known_source_game, current_game_number
     global cycle_triggered, waiting_for_one_part, prediction_target_game
     global rule2_active, rule1_consecutive_count
-    global next_prediction_allowed_at
+    global next_prediction_allowed_at, current_time_cycle_index
     
     if chat_id != SOURCE_CHANNEL_ID:
         return
         
-    game_number = extract_game_number(message_text)
+    game_number = parse_message(message_text).game_number
     if game_number is None:
         return
 
@@ -755,7 +983,7 @@ async def process_prediction_logic_rule1(message_text: str, chat_id: int):
         await try_launch_prediction_rule1()
         return
     
-    now = datetime.now()
+    now = clock.now()
     if now < next_prediction_allowed_at:
         return
         
@@ -790,9 +1018,7 @@ async def process_prediction_logic_rule1(message_text: str, chat_id: int):
 # ============ GESTION MESSAGES ============
 def is_message_finalized(message: str) -> bool:
     """Vérifie si le message est finalisé."""
-    if '⏰' in message:
-        return False
-    return '✅' in message or '🔰' in message or '▶️' in message or 'Finalisé' in message
+    return parse_message(message).finalized
 
 async def process_finalized_message(message_text: str, chat_id: int):
     """Traite les messages finalisés."""
@@ -804,26 +1030,23 @@ async def process_finalized_message(message_text: str, chat_id: int):
             await check_and_send_queued_predictions(current_game_number)
             return
 
-        if not is_message_finalized(message_text):
+        parsed = parse_message(message_text)
+        if not parsed.finalized:
             return
 
-        game_number = extract_game_number(message_text)
+        game_number = parsed.game_number
         if game_number is None:
             return
 
         current_game_number = game_number
         last_source_game_number = game_number
         
-        message_hash = f"{game_number}_{message_text[:50]}"
-        if message_hash in processed_messages:
+        if processed_messages.check_and_add(game_number, message_text[:50]):
             return
-        processed_messages.add(message_hash)
 
-        groups = extract_parentheses_groups(message_text)
-        if len(groups) < 1:
+        first_group = parsed.first_suits
+        if first_group is None:
             return
-            
-        first_group = groups[0]
 
         await check_prediction_result(game_number, first_group)
         await check_and_send_queued_predictions(game_number)
@@ -831,50 +1054,97 @@ async def process_finalized_message(message_text: str, chat_id: int):
     except Exception as e:
         logger.error(f"Erreur traitement finalisé: {e}")
 
+def record_source_message(message_text: str, chat_id: int, edited: bool):
+    """Enregistre le flux des canaux sources (RECORD_STREAM) pour la relecture hors ligne."""
+    if not RECORD_STREAM:
+        return
+    channel = 'source' if chat_id == SOURCE_CHANNEL_ID else 'stats'
+    line = json.dumps({'t': clock.now().timestamp(), 'channel': channel,
+                       'edit': edited, 'text': message_text}, ensure_ascii=False)
+    try:
+        with open(RECORD_STREAM, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        logger.error(f"Erreur enregistrement flux: {e}")
+
+async def process_source_message(message_text: str, chat_id: int, edited: bool = False):
+    """Traitement commun (nouveau ou édité) d'un message des canaux sources."""
+    record_source_message(message_text, chat_id, edited)
+    parsed = parse_message(message_text)
+    tracer.mark('parsed')
+    
+    # 'rule' n'est marquée ici que si aucune règle n'a décidé de prédire
+    if chat_id == SOURCE_CHANNEL_ID:
+        await process_prediction_logic_rule1(message_text, chat_id)
+        tracer.mark('rule')
+        
+        if parsed.finalized:
+            await process_finalized_message(message_text, chat_id)
+    
+    elif chat_id == SOURCE_CHANNEL_2_ID:
+        await process_stats_message(message_text)
+        tracer.mark('rule')
+        await check_and_send_queued_predictions(current_game_number)
+
+@game_actor.on(SourceMessage)
+async def on_source_message(event: SourceMessage):
+    tracer.current = tracer.start(event.received)
+    tracer.mark('actor')
+    try:
+        await process_source_message(event.text, event.chat_id, event.edited)
+    finally:
+        tracer.current = None
+
+@game_actor.on(DrainQueue)
+async def on_drain_queue(event: DrainQueue):
+    await check_and_send_queued_predictions(event.game)
+
+def system_info_message() -> str:
+    """Texte de la commande /info du canal source."""
+    rule1_status = f"{rule1_consecutive_count}/{MAX_RULE1_CONSECUTIVE}"
+    rule2_status = "ACTIVE" if rule2_active else "Inactif"
+    
+    return (
+        f"ℹ️ ÉTAT SYSTÈME\n\n"
+        f"🎮 Jeu: #{current_game_number}\n"
+        f"🔮 Actives: {len(pending_predictions)}\n"
+        f"⏳ R2: {rule2_status}\n"
+        f"⏱️ R1: {rule1_status}\n"
+        f"🎯 Cible R1: #{prediction_target_game if prediction_target_game else 'Aucune'}\n"
+        f"📍 Source: #{last_known_source_game}\n"
+        f"👥 Users: {len(users_data)}"
+    )
+
+async def resolve_chat_id(event) -> int:
+    """
+    ID normalisé du chat: event.chat_id est déjà au format -100... pour les
+    canaux. L'entité n'est récupérée (puis mise en cache par peer ID) qu'en
+    dernier recours; l'expéditeur n'est jamais résolu sur ce chemin.
+    """
+    if event.chat_id is not None:
+        return event.chat_id
+    peer = getattr(event.message, 'peer_id', None)
+    peer_key = (getattr(peer, 'channel_id', None) or getattr(peer, 'chat_id', None)
+                or getattr(peer, 'user_id', None))
+    chat = await entity_cache.resolve(peer_key, event.get_chat)
+    return marked_channel_id(chat)
+
 async def handle_message(event):
     """Gère les nouveaux messages."""
     try:
-        sender = await event.get_sender()
-        sender_id = getattr(sender, 'id', event.sender_id)
-        
-        chat = await event.get_chat()
-        chat_id = chat.id
-        if hasattr(chat, 'broadcast') and chat.broadcast:
-            if not str(chat_id).startswith('-100'):
-                chat_id = int(f"-100{abs(chat_id)}")
+        chat_id = await resolve_chat_id(event)
             
         logger.info(f"Message chat_id={chat_id}: {event.message.message[:50]}...")
 
-        if chat_id == SOURCE_CHANNEL_ID:
+        if chat_id in (SOURCE_CHANNEL_ID, SOURCE_CHANNEL_2_ID):
             message_text = event.message.message
+            game_actor.post(SourceMessage(message_text, chat_id, received=clock.monotonic()))
             
-            await process_prediction_logic_rule1(message_text, chat_id)
-            
-            if is_message_finalized(message_text):
-                await process_finalized_message(message_text, chat_id)
-            
-            if message_text.startswith('/info'):
-                active_preds = len(pending_predictions)
-                rule1_status = f"{rule1_consecutive_count}/{MAX_RULE1_CONSECUTIVE}"
-                rule2_status = "ACTIVE" if rule2_active else "Inactif"
-                
-                info_msg = (
-                    f"ℹ️ ÉTAT SYSTÈME\n\n"
-                    f"🎮 Jeu: #{current_game_number}\n"
-                    f"🔮 Actives: {active_preds}\n"
-                    f"⏳ R2: {rule2_status}\n"
-                    f"⏱️ R1: {rule1_status}\n"
-                    f"🎯 Cible R1: #{prediction_target_game if prediction_target_game else 'Aucune'}\n"
-                    f"📍 Source: #{last_known_source_game}\n"
-                    f"👥 Users: {len(users_data)}"
-                )
+            if chat_id == SOURCE_CHANNEL_ID and message_text.startswith('/info'):
+                # Lu dans l'acteur, après le traitement du message courant
+                info_msg = await game_actor.call(system_info_message)
                 await event.respond(info_msg)
                 return
-        
-        elif chat_id == SOURCE_CHANNEL_2_ID:
-            message_text = event.message.message
-            await process_stats_message(message_text)
-            await check_and_send_queued_predictions(current_game_number)
 
     except Exception as e:
         logger.error(f"Erreur handle_message: {e}")
@@ -884,42 +1154,50 @@ async def handle_message(event):
 async def handle_edited_message(event):
     """Gère les messages édités."""
     try:
-        chat = await event.get_chat()
-        chat_id = chat.id
-        if hasattr(chat, 'broadcast') and chat.broadcast:
-            if not str(chat_id).startswith('-100'):
-                chat_id = int(f"-100{abs(chat_id)}")
+        chat_id = await resolve_chat_id(event)
 
-        if chat_id == SOURCE_CHANNEL_ID:
-            message_text = event.message.message
-            await process_prediction_logic_rule1(message_text, chat_id)
-            
-            if is_message_finalized(message_text):
-                await process_finalized_message(message_text, chat_id)
-        
-        elif chat_id == SOURCE_CHANNEL_2_ID:
-            message_text = event.message.message
-            await process_stats_message(message_text)
-            await check_and_send_queued_predictions(current_game_number)
+        if chat_id in (SOURCE_CHANNEL_ID, SOURCE_CHANNEL_2_ID):
+            game_actor.post(SourceMessage(event.message.message, chat_id, edited=True, received=clock.monotonic()))
 
     except Exception as e:
         logger.error(f"Erreur handle_edited_message: {e}")
 
-client.add_event_handler(handle_message, events.NewMessage())
-client.add_event_handler(handle_edited_message, events.MessageEdited())
+# ============ ROUTAGE DES UPDATES ============
+# Un seul handler par type d'update: chaque message est classé une fois
+# (canal source, commande, admin, utilisateur privé, callback).
+dispatcher = Dispatcher({SOURCE_CHANNEL_ID, SOURCE_CHANNEL_2_ID}, ADMIN_ID)
+dispatcher.route('source')(handle_message)
+dispatcher.route('source_edit')(handle_edited_message)
+# Instance de secours (ou reprise en cours): aucune mise à jour traitée
+dispatcher.gate = lambda: is_leader() and engine_ready
+dispatcher.attach(client)
 
 # ============ TIMEOUT PAIEMENT ============
-async def check_payment_timeout(user_id: int):
-    """Vérifie après 10min si l'admin n'a pas répondu."""
-    await asyncio.sleep(600)  # 10 minutes
+PAYMENT_TIMEOUT_PREFIX = 'payment:'
+
+def payment_timeout_key(user_id: int) -> str:
+    return f"{PAYMENT_TIMEOUT_PREFIX}{user_id}"
+
+@deadline_scheduler.handler('payment_timeout')
+async def check_payment_timeout(key: str, payload: dict):
+    """
+    10min après la capture, l'admin n'a ni validé ni rejeté (sinon l'échéance
+    est annulée). pending_screenshots n'est pas persisté: après un redémarrage,
+    seule la capture enregistrée dans l'échéance justifie le message.
+    """
+    user_id = payload['user_id']
+    state = pending_screenshots.get(user_id)
+    if state is None:
+        if not payload.get('screenshot_msg_id'):
+            return
+    elif state.get('validated', False):
+        return
     
-    if user_id in pending_screenshots and not pending_screenshots[user_id].get('validated', False):
-        user = get_user(user_id)
-        
-        try:
-            await client.send_message(
-                user_id,
-                f"""⏰ **PATIENTEZ S'IL VOUS PLAÎT...**
+    user = get_user(user_id)
+    try:
+        await client.send_message(
+            user_id,
+            f"""⏰ **PATIENTEZ S'IL VOUS PLAÎT...**
 
 Cher {user.get('prenom', 'Client')},
 
@@ -928,14 +1206,79 @@ Cher {user.get('prenom', 'Client')},
 ✅ Il confirmera votre abonnement très prochainement.
 
 🙏 Merci pour votre paiement et votre patience!"""
-            )
-            pending_screenshots[user_id]['notified'] = True
-            logger.info(f"Timeout 10min: message envoyé à {user_id}")
-        except Exception as e:
-            logger.error(f"Erreur timeout message à {user_id}: {e}")
+        )
+        if state is not None:
+            state['notified'] = True
+        logger.info(f"Timeout 10min: message envoyé à {user_id}")
+    except Exception as e:
+        logger.error(f"Erreur timeout message à {user_id}: {e}")
+
+# ============ EXPIRATIONS ============
+def payment_options_message(user: dict) -> tuple:
+    """Message de fin d'accès avec les formules de paiement: (texte, boutons)."""
+    buttons = [
+        [Button.url("💳 24H - 500 FCFA", PAYMENT_LINK_500)],
+        [Button.url("💳 1 SEMAINE - 1500 FCFA", PAYMENT_LINK_1500)],
+        [Button.url("💳 2 SEMAINES - 2800 FCFA", PAYMENT_LINK_2800)]
+    ]
+    
+    expired_msg = f"""⚠️ **VOTRE ESSAI EST TERMINÉ...** ⚠️
+
+🎰 {user.get('prenom', 'CHAMPION')}, vous avez goûté à la puissance de nos prédictions...
+
+💔 **Ne laissez pas la chance s'échapper!**
+
+🔥 **OFFRE EXCLUSIVE:**
+💎 **500 FCFA** = 24H de test prolongé
+💎 **1500 FCFA** = 1 semaine complète  
+💎 **2800 FCFA** = 2 semaines VIP
+
+👇 **CHOISISSEZ VOTRE FORMULE ET REJOIGNEZ LES GAGNANTS!**"""
+    return expired_msg, buttons
+
+async def send_payment_options(user_id: int):
+    text, buttons = payment_options_message(users_data.get(str(user_id), {}))
+    sent_msg = await client.send_message(user_id, text, buttons=buttons)
+    return sent_msg.id
+
+@deadline_scheduler.handler('expiry_sweep')
+async def sweep_expired_access(key: str, payload):
+    """
+    À chaque fin d'accès: retire les expirés de l'index (donc des diffusions),
+    marque l'essai comme utilisé et envoie les formules de paiement par lots.
+    """
+    now = clock.now().timestamp()
+    expired = eligibility_index.prune(now)
+    schedule_expiry_sweep()
+    if not expired:
+        return
+    
+    bot_id_str = BOT_TOKEN.split(':')[0]
+    recipients = []
+    for user_id_str in expired:
+        user = users_data.get(user_id_str)
+        if user is None:
+            continue
+        expiry = compute_access_expiry(user)
+        if user.get('trial_started') and not user.get('trial_used'):
+            user['trial_used'] = True
+        # Pas de relance pour les accès expirés depuis longtemps (ex: bot arrêté)
+        recent = expiry is not None and now - expiry <= EXPIRY_NOTICE_GRACE.total_seconds()
+        if (recent and not user.get('expiry_notified')
+                and user_id_str != str(ADMIN_ID) and user_id_str != bot_id_str):
+            user['expiry_notified'] = True
+            recipients.append(int(user_id_str))
+        save_user(user_id_str)
+    
+    logger.info(f"⌛ {len(expired)} accès expirés, {len(recipients)} à notifier")
+    
+    for start in range(0, len(recipients), EXPIRY_NOTICE_BATCH):
+        batch = recipients[start:start + EXPIRY_NOTICE_BATCH]
+        report = await broadcast_engine.run(batch, send_payment_options)
+        ErrorSampler(LOG_ERROR_SAMPLES).extend(report.errors).log(logger, "Notification expiration")
 
 # ============ COMMANDES UTILISATEUR ============
-@client.on(events.NewMessage(pattern='/start'))
+@dispatcher.command('/start')
 async def cmd_start(event):
     if event.is_group or event.is_channel: 
         return
@@ -965,8 +1308,8 @@ Les prédictions arrivent automatiquement ici.
             
         elif is_trial_active(user_id):
             trial_start = datetime.fromisoformat(user['trial_started'])
-            trial_end = trial_start + timedelta(minutes=60)
-            remaining = (trial_end - datetime.now()).seconds // 60
+            trial_end = trial_start + TRIAL_DURATION
+            remaining = (trial_end - clock.now()).seconds // 60
             
             trial_msg = f"""⏰ **VOTRE ESSAI VIP EST EN COURS!** ⏰
 
@@ -980,25 +1323,7 @@ Les prédictions arrivent automatiquement ici.
             
         else:
             update_user(user_id, {'trial_used': True})
-            buttons = [
-                [Button.url("💳 24H - 500 FCFA", PAYMENT_LINK_500)],
-                [Button.url("💳 1 SEMAINE - 1500 FCFA", PAYMENT_LINK_1500)],
-                [Button.url("💳 2 SEMAINES - 2800 FCFA", PAYMENT_LINK_2800)]
-            ]
-            
-            expired_msg = f"""⚠️ **VOTRE ESSAI EST TERMINÉ...** ⚠️
-
-🎰 {user.get('prenom', 'CHAMPION')}, vous avez goûté à la puissance de nos prédictions...
-
-💔 **Ne laissez pas la chance s'échapper!**
-
-🔥 **OFFRE EXCLUSIVE:**
-💎 **500 FCFA** = 24H de test prolongé
-💎 **1500 FCFA** = 1 semaine complète  
-💎 **2800 FCFA** = 2 semaines VIP
-
-👇 **CHOISISSEZ VOTRE FORMULE ET REJOIGNEZ LES GAGNANTS!**"""
-            
+            expired_msg, buttons = payment_options_message(user)
             await event.respond(expired_msg, buttons=buttons)
             return
     
@@ -1021,16 +1346,10 @@ Les prédictions arrivent automatiquement ici.
     user_conversation_state[user_id] = 'awaiting_nom'
     await event.respond("📝 **Étape 1/3: Quel est votre NOM?**")
 
-@client.on(events.NewMessage())
-async def handle_registration_and_payment(event):
-    if event.is_group or event.is_channel: 
-        return
-    
-    if event.message.message and event.message.message.startswith('/'): 
-        return
-    
+@dispatcher.route('admin')
+async def handle_admin_input(event):
+    """Texte libre de l'admin: réponses aux flux /msg et /predict, sinon flux utilisateur."""
     user_id = event.sender_id
-    user = get_user(user_id)
     
     # Admin message
     if user_id in admin_message_state:
@@ -1039,7 +1358,7 @@ async def handle_registration_and_payment(event):
             target_user_id = state.get('target_user_id')
             message_content = event.message.message
             
-            current_time = datetime.now().strftime("%H:%M:%S")
+            current_time = clock.now().strftime("%H:%M:%S")
             full_message = f"""📨 **Message de {ADMIN_NAME}**
 _{ADMIN_TITLE}_
 
@@ -1069,18 +1388,36 @@ _{ADMIN_TITLE}_
                 await event.respond("❌ Aucun numéro valide.")
                 return
             
-            sent = 0
-            details = []
-            for n in nums:
-                suit = get_suit_for_number(n)
-                if await send_prediction_to_users(n, suit, last_known_source_game, rule_type="R1"):
-                    sent += 1
-                    details.append(f"#{n} {SUIT_DISPLAY.get(suit, suit)}")
+            async def send_manual_predictions():
+                launched = []
+                for n, suit in zip(nums, get_suits_for_numbers(nums)):
+                    if await send_prediction_to_users(n, suit, last_known_source_game, rule_type="R1"):
+                        launched.append((n, suit, delivery_tasks[n]))
+                return launched
             
+            # Comptées une fois la diffusion terminée (hors de l'acteur)
+            launched = await game_actor.call(send_manual_predictions)
+            delivered = await asyncio.gather(*(task for _, _, task in launched))
+            details = [f"#{n} {SUIT_DISPLAY.get(suit, suit)}"
+                       for (n, suit, _), count in zip(launched, delivered) if count]
+            sent = len(details)
             await event.respond(f"✅ **{sent} envoyées**\n\n" + "\n".join(details[:20]))
             del admin_predict_state[user_id]
             return
     
+    await handle_registration_and_payment(event)
+
+@dispatcher.route('private')
+async def handle_registration_and_payment(event):
+    if event.is_group or event.is_channel: 
+        return
+    
+    if event.message.message and event.message.message.startswith('/'): 
+        return
+    
+    user_id = event.sender_id
+    user = get_user(user_id)
+    
     # Inscription
     if user_id in user_conversation_state:
         state = user_conversation_state[user_id]
@@ -1118,7 +1455,7 @@ _{ADMIN_TITLE}_
             update_user(user_id, {
                 'pays': message_text,
                 'registered': True,
-                'trial_started': datetime.now().isoformat(),
+                'trial_started': clock.now().isoformat(),
                 'trial_used': False
             })
             del user_conversation_state[user_id]
@@ -1170,7 +1507,7 @@ Les meilleures opportunités arrivent sans prévenir!
                 f"👤 {user.get('prenom', 'User')} {user.get('nom', '')}\n"
                 f"🆔 `{user_id}`\n"
                 f"📍 {user.get('pays', 'N/A')}\n\n"
-                f"⏰ Reçu à: {datetime.now().strftime('%H:%M:%S')}\n"
+                f"⏰ Reçu à: {clock.now().strftime('%H:%M:%S')}\n"
                 f"⏳ Timeout dans 10 min",
                 buttons=buttons,
                 reply_to=forwarded.id
@@ -1178,13 +1515,15 @@ Les meilleures opportunités arrivent sans prévenir!
             
             # Stocke pour timeout
             pending_screenshots[user_id] = {
-                'sent_at': datetime.now(),
+                'sent_at': clock.now(),
                 'notified': False,
                 'validated': False
             }
             
-            # Lance timeout 10min
-            asyncio.create_task(check_payment_timeout(user_id))
+            # Timeout 10min (échéance persistée, annulée à la validation/au rejet)
+            deadline_scheduler.schedule(payment_timeout_key(user_id), clock.now() + PAYMENT_TIMEOUT,
+                                        'payment_timeout',
+                                        {'user_id': user_id, 'screenshot_msg_id': event.message.id})
             
             update_user(user_id, {'awaiting_screenshot': False})
             
@@ -1258,7 +1597,7 @@ Les meilleures opportunités arrivent sans prévenir!
         return
 
 # ============ COMMANDES ADMIN ============
-@client.on(events.NewMessage(pattern='/users'))
+@dispatcher.command('/users')
 async def cmd_users(event):
     if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
         return
@@ -1283,7 +1622,7 @@ async def cmd_users(event):
 💡 `/msg ID` pour envoyer un message""")
         await asyncio.sleep(0.5)
 
-@client.on(events.NewMessage(pattern=r'^/msg (\d+)$'))
+@dispatcher.command('/msg', r'^/msg (\d+)$')
 async def cmd_msg(event):
     if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
         return
@@ -1306,7 +1645,7 @@ async def cmd_msg(event):
     except Exception as e:
         await event.respond(f"❌ Erreur: {e}")
 
-@client.on(events.CallbackQuery(data=re.compile(b'val_(\d+)_(.*)')))
+@dispatcher.callback(b'val', rb'val_(\d+)_(.*)')
 async def handle_validation(event):
     if event.sender_id != ADMIN_ID:
         await event.answer("Accès refusé", alert=True)
@@ -1315,16 +1654,18 @@ async def handle_validation(event):
     user_id = int(event.data_match.group(1).decode())
     duration = event.data_match.group(2).decode()
     
-    # Marque comme validé pour annuler timeout
+    # Marque comme validé et annule le timeout
     if user_id in pending_screenshots:
         pending_screenshots[user_id]['validated'] = True
+    deadline_scheduler.cancel(payment_timeout_key(user_id))
     
     days = {'1d': 1, '1w': 7, '2w': 14}.get(duration, 1)
-    end = datetime.now() + timedelta(days=days)
+    end = clock.now() + timedelta(days=days)
     
     update_user(user_id, {
         'subscription_end': end.isoformat(),
-        'subscription_type': 'premium'
+        'subscription_type': 'premium',
+        'expiry_notified': False
     })
     
     try:
@@ -1335,7 +1676,7 @@ async def handle_validation(event):
     await event.edit(f"✅ {user_id} validé ({days}j)")
     await event.answer("Activé!")
 
-@client.on(events.CallbackQuery(data=re.compile(b'rej_(\d+)')))
+@dispatcher.callback(b'rej', rb'rej_(\d+)')
 async def handle_rejection(event):
     if event.sender_id != ADMIN_ID:
         await event.answer("Accès refusé", alert=True)
@@ -1343,9 +1684,10 @@ async def handle_rejection(event):
     
     user_id = int(event.data_match.group(1).decode())
     
-    # Marque comme traité
+    # Marque comme traité et annule le timeout
     if user_id in pending_screenshots:
         pending_screenshots[user_id]['validated'] = True
+    deadline_scheduler.cancel(payment_timeout_key(user_id))
     
     try:
         await client.send_message(user_id, "❌ Demande rejetée.")
@@ -1355,17 +1697,17 @@ async def handle_rejection(event):
     await event.edit(f"❌ {user_id} rejeté")
     await event.answer("Rejeté")
 
-@client.on(events.CallbackQuery(data=re.compile(b'valider_(\d+)_(.*)')))
+@dispatcher.callback(b'valider', rb'valider_(\d+)_(.*)')
 async def handle_validation_old(event):
     """Compatibilité anciens boutons"""
     await handle_validation(event)
 
-@client.on(events.CallbackQuery(data=re.compile(b'rejeter_(\d+)')))
+@dispatcher.callback(b'rejeter', rb'rejeter_(\d+)')
 async def handle_rejection_old(event):
     """Compatibilité anciens boutons"""
     await handle_rejection(event)
 
-@client.on(events.NewMessage(pattern=r'^/a (\d+)$'))
+@dispatcher.command('/a', r'^/a (\d+)$')
 async def cmd_set_a_shortcut(event):
     if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
         return
@@ -1378,13 +1720,18 @@ async def cmd_set_a_shortcut(event):
     except Exception as e:
         await event.respond(f"❌ Erreur: {e}")
 
-@client.on(events.NewMessage(pattern='/status'))
+@dispatcher.command('/status')
 async def cmd_status(event):
     if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
         return
     
     info = f"#{prediction_target_game}" if prediction_target_game else "Aucune"
-    eligible = sum(1 for u in users_data if can_receive_predictions(int(u)))
+    eligible = len(eligibility_index)
+    dedup = processed_messages.stats()
+    routes = "\n".join(
+        f"• {name}: {count} | {avg:.1f} | {peak:.0f}" + (f" | ❌{errors}" if errors else "")
+        for name, count, avg, peak, errors in dispatcher.summary()
+    )
     
     await event.respond(f"""📊 **STATUT**
 
@@ -1394,45 +1741,56 @@ async def cmd_status(event):
 🎯 Cycle: {current_time_cycle_index} ({TIME_CYCLE[current_time_cycle_index]}min)
 📅 Cible: {info}
 👥 Users: {len(users_data)} | Éligibles: {eligible}
-📋 Actives: {len(pending_predictions)}""")
+📋 Actives: {len(pending_predictions)}
+🧹 Dédup: {dedup['entries']} entrées | {dedup['hits']} doublons / {dedup['misses']} nouveaux / {dedup['stale']} périmés
+🎭 Acteur: {game_actor.processed} évts | file {game_actor.depth} | latence max {game_actor.max_lag * 1000:.0f}ms | E/S {io_queue.pending}
 
-@client.on(events.NewMessage(pattern='/reset'))
+⚡ **Routes** (nb | moy | max ms)
+{routes or 'Aucune'}""")
+
+@dispatcher.command('/latence', r'^/latence(?:\s+(\d+))?$')
+async def cmd_latency(event):
+    """Percentiles de latence par étape sur les N dernières prédictions."""
+    if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
+        return
+    
+    last = int(event.pattern_match.group(1) or TRACE_CAPACITY)
+    summary = tracer.summary(last)
+    if not summary:
+        await event.respond("⏱️ Aucune prédiction tracée pour l'instant.")
+        return
+    
+    lines = "\n".join(
+        f"• {stage}: {s['p50']:.0f} | {s['p95']:.0f} | {s['p99']:.0f} ({s['count']})"
+        for stage, s in summary.items()
+    )
+    await event.respond(f"""⏱️ **LATENCES** ({min(last, len(tracer.completed))} dernières prédictions)
+
+Étape: p50 | p95 | p99 ms (nb)
+{lines}""")
+
+@dispatcher.command('/reset')
 async def cmd_reset(event):
     if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
         return
     
-    global users_data, pending_predictions, queued_predictions, processed_messages
-    global current_game_number, last_source_game_number, stats_bilan
-    global rule1_consecutive_count, rule2_active, suit_prediction_counts
-    global last_known_source_game, current_time_cycle_index
-    global prediction_target_game, waiting_for_one_part, cycle_triggered
-    global pending_screenshots
+    global users_data
     
     users_data = {}
     save_users_data()
-    pending_predictions.clear()
-    queued_predictions.clear()
-    processed_messages.clear()
-    suit_prediction_counts.clear()
-    pending_screenshots.clear()
     
-    current_game_number = 0
-    last_source_game_number = 0
-    last_known_source_game = 0
-    current_time_cycle_index = 0
-    prediction_target_game = None
-    waiting_for_one_part = False
-    cycle_triggered = False
+    def reset_game_state():
+        global stats_bilan
+        suit_prediction_counts.clear()
+        reset_prediction_state()
+        stats_bilan = {'total': 0, 'wins': 0, 'losses': 0, 'win_details': {'✅0️⃣': 0, '✅1️⃣': 0, '✅2️⃣': 0}, 'loss_details': {'❌': 0}}
     
-    rule1_consecutive_count = 0
-    rule2_active = False
-    
-    stats_bilan = {'total': 0, 'wins': 0, 'losses': 0, 'win_details': {'✅0️⃣': 0, '✅1️⃣': 0, '✅2️⃣': 0}, 'loss_details': {'❌': 0}}
+    await game_actor.call(reset_game_state)
     
     logger.warning("🚨 RESET TOTAL")
     await event.respond("🚨 **RESET OK**")
 
-@client.on(events.NewMessage(pattern='/bilan'))
+@dispatcher.command('/bilan')
 async def cmd_bilan(event):
     if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
         return
@@ -1455,7 +1813,7 @@ Détails:
 • 3ème: {stats_bilan['win_details'].get('✅2️⃣', 0)}
 • 4ème: {stats_bilan['win_details'].get('✅3️⃣', 0)}""")
 
-@client.on(events.NewMessage(pattern='/help'))
+@dispatcher.command('/help')
 async def cmd_help(event):
     if event.is_group or event.is_channel:
         return
@@ -1473,6 +1831,7 @@ async def cmd_help(event):
 
 📊 **Commandes admin:**
 /status - État du bot
+/latence [N] - Latences par étape
 /predict - Prédiction manuelle
 /bilan - Statistiques
 /reset - Reset total
@@ -1480,7 +1839,7 @@ async def cmd_help(event):
 /msg ID - Envoyer message
 /force - Forcer/régulariser""")
 
-@client.on(events.NewMessage(pattern='/payer'))
+@dispatcher.command('/payer')
 async def cmd_payer(event):
     if event.is_group or event.is_channel:
         return
@@ -1506,7 +1865,7 @@ async def cmd_payer(event):
 👇 **VOTRE FORMULE:**""", buttons=buttons)
     update_user(user_id, {'awaiting_screenshot': True})
 
-@client.on(events.NewMessage(pattern='/predict'))
+@dispatcher.command('/predict')
 async def cmd_predict(event):
     if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
         return
@@ -1525,44 +1884,40 @@ async def cmd_predict(event):
 
 Entrez numéros (pairs >= 6, fin 2/4/6/8):""")
 
-@client.on(events.NewMessage(pattern='/force'))
-async def cmd_force(event):
-    """Force/régularise les prédictions."""
-    if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
-        return
-    
+async def force_rule1_cycle() -> list:
+    """Force/régularise le cycle R1 (exécuté dans l'acteur); renvoie les réponses à afficher."""
     global cycle_triggered, waiting_for_one_part, prediction_target_game
     global rule2_active, rule1_consecutive_count, current_time_cycle_index
     global next_prediction_allowed_at, last_known_source_game
     
-    now = datetime.now()
+    now = clock.now()
+    replies = []
     
     # Vérifie R2 active
     if rule2_active:
-        active_r2 = [g for g, p in pending_predictions.items() 
-                     if p.get('rule_type') == 'R2' and p.get('rattrapage', 0) == 0]
+        active_r2 = sorted(pending_predictions.games('R2', 0))
         if active_r2:
-            await event.respond(f"""🔴 **R2 ACTIVE**
+            replies.append(f"""🔴 **R2 ACTIVE**
 
 Prédictions en cours: {', '.join([f'#{g}' for g in active_r2[:5]])}
 
 ⏳ Attendez fin R2 ou /reset""")
-            return
+            return replies
     
     # Vérifie limite R1
     if rule1_consecutive_count >= MAX_RULE1_CONSECUTIVE:
-        await event.respond(f"""🟡 **R1 EN LIMITE**
+        replies.append(f"""🟡 **R1 EN LIMITE**
 
 {rule1_consecutive_count}/{MAX_RULE1_CONSECUTIVE}
 Attendez déclenchement R2.""")
-        return
+        return replies
     
     # Vérifie 1 part away en cours
     if waiting_for_one_part and prediction_target_game:
         trigger = prediction_target_game - 1
         
         if last_known_source_game >= trigger:
-            await event.respond(f"""🚨 **BLOCAGE!**
+            replies.append(f"""🚨 **BLOCAGE!**
 
 Déclencheur #{trigger} PASSÉ!
 Dernier: #{last_known_source_game}
@@ -1571,18 +1926,18 @@ Dernier: #{last_known_source_game}
             
             success = await try_launch_prediction_rule1()
             if success:
-                await event.respond(f"✅ #{prediction_target_game} forcé!")
+                replies.append(f"✅ #{prediction_target_game} forcé!")
             else:
-                await event.respond("❌ Échec forçage")
-            return
+                replies.append("❌ Échec forçage")
+            return replies
         
         minutes_wait = trigger - last_known_source_game
-        await event.respond(f"""⏳ **EN COURS**
+        replies.append(f"""⏳ **EN COURS**
 
 Cible: #{prediction_target_game}
 Déclencheur: #{trigger}
 ⏱️ Dans ~{minutes_wait} min""")
-        return
+        return replies
     
     # Vérifie temps cycle
     if now < next_prediction_allowed_at:
@@ -1599,11 +1954,11 @@ Déclencheur: #{trigger}
         
         suit = get_suit_for_number(candidate)
         
-        await event.respond(f"""⏳ **TEMPS CYCLE**
+        replies.append(f"""⏳ **TEMPS CYCLE**
 
 Dans {wait_min} min
 Prévu: #{candidate} ({SUIT_DISPLAY.get(suit, suit)})""")
-        return
+        return replies
     
     # Force déclenchement
     if not cycle_triggered:
@@ -1615,7 +1970,7 @@ Prévu: #{candidate} ({SUIT_DISPLAY.get(suit, suit)})""")
         
         prediction_target_game = candidate
         
-        await event.respond(f"""🔧 **FORÇAGE**
+        replies.append(f"""🔧 **FORÇAGE**
 
 Cible: #{candidate}
 Attente #{candidate - 1}...""")
@@ -1623,16 +1978,16 @@ Attente #{candidate - 1}...""")
         if is_one_part_away(last_known_source_game, candidate):
             success = await try_launch_prediction_rule1()
             if success:
-                await event.respond(f"✅ #{candidate} envoyé immédiatement!")
+                replies.append(f"✅ #{candidate} envoyé immédiatement!")
         
-        return
+        return replies
     
     # Cycle déclenché, en attente
     if cycle_triggered and prediction_target_game:
         trigger = prediction_target_game - 1
         
         if last_known_source_game >= trigger:
-            await event.respond(f"""🚨 **RÉCUPÉRATION**
+            replies.append(f"""🚨 **RÉCUPÉRATION**
 
 Déclencheur passé, recalcul...""")
             
@@ -1647,27 +2002,37 @@ Déclencheur passé, recalcul...""")
             
             if is_one_part_away(last_known_source_game, candidate):
                 await try_launch_prediction_rule1()
-                await event.respond(f"✅ Nouveau #{candidate} envoyé!")
+                replies.append(f"✅ Nouveau #{candidate} envoyé!")
             else:
                 waiting_for_one_part = True
-                await event.respond(f"⏳ Nouvelle attente #{candidate}")
+                replies.append(f"⏳ Nouvelle attente #{candidate}")
         else:
             minutes_wait = trigger - last_known_source_game
-            await event.respond(f"""⏳ **ATTENTE**
+            replies.append(f"""⏳ **ATTENTE**
 
 Cible: #{prediction_target_game}
 Dans ~{minutes_wait} min""")
         
-        return
+        return replies
     
     # Initialise
-    await event.respond("🔄 **INITIALISATION**")
+    replies.append("🔄 **INITIALISATION**")
     next_prediction_allowed_at = now
     
     await process_prediction_logic_rule1(f"#N {last_known_source_game}", SOURCE_CHANNEL_ID)
-    await event.respond("✅ Cycle démarré!")
+    replies.append("✅ Cycle démarré!")
+    return replies
 
-@client.on(events.NewMessage(pattern='/next'))
+@dispatcher.command('/force')
+async def cmd_force(event):
+    """Force/régularise les prédictions."""
+    if event.is_group or event.is_channel or event.sender_id != ADMIN_ID:
+        return
+    
+    for reply in await game_actor.call(force_rule1_cycle):
+        await event.respond(reply)
+
+@dispatcher.command('/next')
 async def cmd_next(event):
     """Affiche le prochain numéro à prédire."""
     if event.is_group or event.is_channel:
@@ -1733,8 +2098,12 @@ async def cmd_next(event):
 🎯 Cible: #{prediction_target_game if prediction_target_game else candidate}""")
 
 # ============ SERVEUR WEB ============
-async def index(request):
-    html = f"""<!DOCTYPE html>
+def status_key() -> tuple:
+    """État affiché par la page de statut: elle n'est régénérée que s'il change."""
+    return current_game_number, len(users_data), rule2_active
+
+def render_index_html(game_number: int, users_count: int, r2_active: bool) -> str:
+    return f"""<!DOCTYPE html>
 <html>
 <head>
     <title>Bot Baccarat ELITE</title>
@@ -1750,41 +2119,97 @@ async def index(request):
     <h1>🎰 Bot Baccarat ELITE</h1>
     <div class="status">
         <div class="label">Jeu Actuel</div>
-        <div class="number">#{current_game_number}</div>
+        <div class="number">#{game_number}</div>
     </div>
     <div class="status">
         <div class="label">Utilisateurs</div>
-        <div class="number">{len(users_data)}</div>
+        <div class="number">{users_count}</div>
     </div>
     <div class="status">
         <div class="label">Règle 2</div>
-        <div class="number">{'ACTIVE 🔥' if rule2_active else 'Standby'}</div>
+        <div class="number">{'ACTIVE 🔥' if r2_active else 'Standby'}</div>
     </div>
     <p style="margin-top: 40px;">Système opérationnel | Algorithmes actifs</p>
 </body>
 </html>"""
-    return web.Response(text=html, content_type='text/html', status=200)
+
+def render_status_json(game_number: int, users_count: int, r2_active: bool) -> str:
+    return json.dumps({'current_game': game_number, 'users': users_count, 'rule2_active': r2_active})
+
+index_page = CachedBody(render_index_html, 'text/html; charset=utf-8')
+status_json_page = CachedBody(render_status_json, 'application/json; charset=utf-8')
+
+async def index(request):
+    return index_page.get(status_key()).response(request)
+
+async def status_json(request):
+    return status_json_page.get(status_key()).response(request)
 
 async def health_check(request):
     return web.Response(text="OK", status=200)
 
+async def traces_endpoint(request):
+    """Percentiles de latence par étape (JSON); ?last=N limite aux N dernières prédictions."""
+    try:
+        last = int(request.query.get('last', 0)) or None
+    except ValueError:
+        last = None
+    recent = list(tracer.completed)[-20:]
+    return web.json_response({
+        'predictions': len(tracer.completed),
+        'stages_ms': tracer.summary(last),
+        'recent': [trace.to_dict() for trace in reversed(recent)],
+    })
+
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': Registry.CONTENT_TYPE})
+
 async def start_web_server():
     app = web.Application()
     app.router.add_get('/', index)
     app.router.add_get('/health', health_check)
+    app.router.add_get('/status.json', status_json)
+    app.router.add_get('/metrics', metrics_endpoint)
+    app.router.add_get('/traces', traces_endpoint)
 
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', PORT)
+    # Actif/secours sur le même hôte: les deux instances écoutent le même port
+    site = web.TCPSite(runner, '0.0.0.0', PORT, reuse_port=LEADER_LEASE_TTL > 0 or None)
     await site.start()
     logger.info(f"Serveur web port {PORT}")
 
 # ============ RESET QUOTIDIEN ============
+def reset_prediction_state():
+    """Remet à zéro l'état du moteur de prédiction (reset quotidien et /reset)."""
+    global current_game_number, last_source_game_number
+    global last_known_source_game, current_time_cycle_index
+    global prediction_target_game, waiting_for_one_part, cycle_triggered
+    global rule1_consecutive_count, rule2_active
+    
+    pending_predictions.clear()
+    queued_predictions.clear()
+    processed_messages.clear()
+    # Captures oubliées: leurs échéances ne doivent plus relancer l'utilisateur
+    pending_screenshots.clear()
+    deadline_scheduler.cancel_prefix(PAYMENT_TIMEOUT_PREFIX)
+    
+    current_game_number = 0
+    last_source_game_number = 0
+    last_known_source_game = 0
+    current_time_cycle_index = 0
+    prediction_target_game = None
+    waiting_for_one_part = False
+    cycle_triggered = False
+    
+    rule1_consecutive_count = 0
+    rule2_active = False
+
 async def schedule_daily_reset():
     wat_tz = timezone(timedelta(hours=1))
     
     while True:
-        now = datetime.now(wat_tz)
+        now = clock.now(wat_tz)
         target = datetime.combine(now.date(), time(0, 59, tzinfo=wat_tz))
         
         if now >= target:
@@ -1793,34 +2218,173 @@ async def schedule_daily_reset():
         wait_seconds = (target - now).total_seconds()
         logger.info(f"Prochain reset dans {timedelta(seconds=wait_seconds)}")
         
-        await asyncio.sleep(wait_seconds)
+        await clock.sleep(wait_seconds)
         
         logger.warning("🚨 RESET QUOTIDIEN!")
         
-        global pending_predictions, queued_predictions, processed_messages
-        global current_game_number, last_source_game_number
-        global last_known_source_game, current_time_cycle_index
-        global prediction_target_game, waiting_for_one_part, cycle_triggered
-        global rule1_consecutive_count, rule2_active, pending_screenshots
-        
-        pending_predictions.clear()
-        queued_predictions.clear()
-        processed_messages.clear()
-        pending_screenshots.clear()
-        
-        current_game_number = 0
-        last_source_game_number = 0
-        last_known_source_game = 0
-        current_time_cycle_index = 0
-        prediction_target_game = None
-        waiting_for_one_part = False
-        cycle_triggered = False
-        
-        rule1_consecutive_count = 0
-        rule2_active = False
+        await game_actor.call(reset_prediction_state)
         
         logger.warning("✅ Reset effectué.")
 
+# ============ ÉTAT DU MOTEUR (REDÉMARRAGE) ============
+def capture_engine_state() -> dict:
+    """État du moteur de prédiction au format JSON (clés de jeu en texte)."""
+    return {
+        'engine': {
+            'current_game_number': current_game_number,
+            'last_source_game_number': last_source_game_number,
+            'last_known_source_game': last_known_source_game,
+            'current_time_cycle_index': current_time_cycle_index,
+            'next_prediction_allowed_at': next_prediction_allowed_at.isoformat(),
+            'prediction_target_game': prediction_target_game,
+            'waiting_for_one_part': waiting_for_one_part,
+            'cycle_triggered': cycle_triggered,
+            'rule1_consecutive_count': rule1_consecutive_count,
+            'rule2_active': rule2_active,
+            'suit_prediction_counts': suit_prediction_counts,
+            'stats_bilan': stats_bilan,
+            'USER_A': USER_A,
+        },
+        'pending': {str(game): pred for game, pred in pending_predictions.items()},
+        'queued': {str(game): data for game, data in queued_predictions.items()},
+    }
+
+def apply_engine_state(state: dict):
+    """Réinstalle un état capturé par capture_engine_state()."""
+    global current_game_number, last_source_game_number, last_known_source_game
+    global current_time_cycle_index, next_prediction_allowed_at, prediction_target_game
+    global waiting_for_one_part, cycle_triggered, rule1_consecutive_count, rule2_active
+    global suit_prediction_counts, stats_bilan, USER_A
+    
+    engine = state.get('engine', {})
+    current_game_number = engine.get('current_game_number', current_game_number)
+    last_source_game_number = engine.get('last_source_game_number', last_source_game_number)
+    last_known_source_game = engine.get('last_known_source_game', last_known_source_game)
+    current_time_cycle_index = engine.get('current_time_cycle_index', current_time_cycle_index) % len(TIME_CYCLE)
+    if engine.get('next_prediction_allowed_at'):
+        next_prediction_allowed_at = datetime.fromisoformat(engine['next_prediction_allowed_at'])
+    prediction_target_game = engine.get('prediction_target_game', prediction_target_game)
+    waiting_for_one_part = engine.get('waiting_for_one_part', waiting_for_one_part)
+    cycle_triggered = engine.get('cycle_triggered', cycle_triggered)
+    rule1_consecutive_count = engine.get('rule1_consecutive_count', rule1_consecutive_count)
+    rule2_active = engine.get('rule2_active', rule2_active)
+    suit_prediction_counts = engine.get('suit_prediction_counts', suit_prediction_counts)
+    stats_bilan = engine.get('stats_bilan', stats_bilan)
+    USER_A = engine.get('USER_A', USER_A)
+    
+    pending_predictions.clear()
+    for game, pred in state.get('pending', {}).items():
+        pending_predictions[int(game)] = pred
+    # Les rattrapages partagent à nouveau les message_id de leur prédiction d'origine
+    for pred in pending_predictions.values():
+        original = pending_predictions.get(pred.get('original_game'))
+        if pred.get('rattrapage', 0) > 0 and original is not None:
+            pred['private_messages'] = original.setdefault('private_messages', {})
+    queued_predictions.clear()
+    for game, data in state.get('queued', {}).items():
+        queued_predictions[int(game)] = data
+
+def restore_engine_state():
+    """Recharge l'état du moteur (instantané + journal) avant la connexion Telegram."""
+    global engine_journal
+    if not ENGINE_STATE_FILE:
+        return
+    
+    engine_journal = EngineJournal(ENGINE_STATE_FILE, ENGINE_SNAPSHOT_EVERY)
+    try:
+        state = engine_journal.load()
+        if state:
+            apply_engine_state(state)
+            logger.info(
+                f"♻️ État moteur restauré: jeu #{current_game_number}, "
+                f"{len(pending_predictions)} en cours, {len(queued_predictions)} en file"
+            )
+    except Exception as e:
+        logger.error(f"Erreur restauration état moteur: {e}")
+        engine_journal.set_aside()
+    # Instantané compact de départ, le journal repart à zéro
+    engine_journal.snapshot(capture_engine_state())
+
+def save_engine_state():
+    """Dernier instantané à l'arrêt du bot."""
+    if engine_journal is None:
+        return
+    try:
+        engine_journal.snapshot(capture_engine_state())
+        engine_journal.close()
+    except Exception as e:
+        logger.error(f"Erreur sauvegarde état moteur: {e}")
+
+@game_actor.observe
+def journal_engine_state(event):
+    if engine_journal is not None:
+        engine_journal.track(capture_engine_state())
+
+# ============ ACTIF / SECOURS ============
+def is_leader() -> bool:
+    """Vrai hors mode actif/secours, sinon seulement pour le détenteur du bail."""
+    return leader_election is None or leader_election.is_leader
+
+def sync_standby_state():
+    """Secours: recharge l'état publié par le leader (instantané + journal) s'il a changé."""
+    global standby_state_mark
+    if not ENGINE_STATE_FILE:
+        return
+    journal = EngineJournal(ENGINE_STATE_FILE, ENGINE_SNAPSHOT_EVERY)
+    mark = journal.signature()
+    if mark == standby_state_mark:
+        return
+    try:
+        state = journal.load()
+    except Exception as e:
+        logger.error(f"Secours: état du leader illisible ({e})")
+        return
+    if state:
+        apply_engine_state(state)
+    standby_state_mark = mark
+
+def take_over_engine():
+    """Promotion: reprend utilisateurs, échéances et état moteur laissés par l'ancien leader."""
+    global standby_state_mark
+    load_users_data()
+    deadline_scheduler.attach(user_store)
+    restore_engine_state()
+    standby_state_mark = None
+
+def start_leader_tasks():
+    leader_tasks.append(asyncio.create_task(deadline_scheduler.run()))
+    leader_tasks.append(asyncio.create_task(schedule_daily_reset()))
+    if sender_pool is not None:
+        leader_tasks.append(asyncio.create_task(sender_pool.run()))
+
+async def on_promoted(term: int):
+    global engine_ready
+    engine_ready = False
+    try:
+        await game_actor.call(take_over_engine)
+    except Exception:
+        # Reprise à retenter au prochain tour d'élection (le bail reste détenu)
+        leader_election.term = None
+        raise
+    start_leader_tasks()
+    engine_ready = True
+    logger.info(f"🚀 Instance {leader_election.lease.holder} active (mandat {term})")
+
+async def on_demoted():
+    global engine_journal, engine_ready
+    engine_ready = False
+    for task in leader_tasks:
+        task.cancel()
+    await asyncio.gather(*leader_tasks, return_exceptions=True)
+    leader_tasks.clear()
+    # Plus d'écriture de l'état: le nouveau leader en est propriétaire
+    if engine_journal is not None:
+        engine_journal.close()
+        engine_journal = None
+
+async def on_standby():
+    await game_actor.call(sync_standby_state)
+
 # ============ DÉMARRAGE ============
 async def start_bot():
     try:
@@ -1832,7 +2396,19 @@ async def start_bot():
         return False
 
 async def main():
+    global leader_election, engine_ready
     load_users_data()
+    if LEADER_LEASE_TTL > 0:
+        engine_ready = False
+        holder = INSTANCE_ID or f"{socket.gethostname()}:{os.getpid()}"
+        leader_election = LeaderElection(
+            SqliteLease(USERS_DB, 'engine', holder, LEADER_LEASE_TTL), clock,
+            on_promote=on_promoted, on_demote=on_demoted, on_standby=on_standby
+        )
+        # État chaud dès le départ; restauré complètement à la promotion
+        sync_standby_state()
+    else:
+        restore_engine_state()
     try:
         await start_web_server()
         success = await start_bot()
@@ -1840,7 +2416,12 @@ async def main():
             logger.error("Échec démarrage")
             return
 
-        asyncio.create_task(schedule_daily_reset())
+        asyncio.create_task(game_actor.run())
+        asyncio.create_task(users_writer.run())
+        if leader_election is not None:
+            asyncio.create_task(leader_election.run())
+        else:
+            start_leader_tasks()
         
         logger.info("🚀 BOT OPÉRATIONNEL")
         await client.run_until_disconnected()
@@ -1850,6 +2431,12 @@ async def main():
         import traceback
         logger.error(traceback.format_exc())
     finally:
+        await flush_users_data()
+        save_engine_state()
+        if sender_pool is not None:
+            await sender_pool.stop()
+        if leader_election is not None and leader_election.term is not None:
+            leader_election.lease.release()
         if client.is_connected():
             await client.disconnect()
 
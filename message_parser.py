@@ -0,0 +1,66 @@
+"""
+Analyse des messages des canaux sources (une seule fois par texte)
+"""
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
+
+GAME_RE = re.compile(r"#N\s*(\d+)", re.IGNORECASE)
+GROUP_RE = re.compile(r"\(([^)]*)\)")
+STATS_RE = re.compile(r"([♠♥♦♣])\ufe0f?\s*:\s*(\d+)")
+
+_EMPTY_STATS = MappingProxyType({})
+
+
+class ParsedMessage(NamedTuple):
+    """Message source analysé (immuable): numéro, état finalisé, groupes et statistiques."""
+    game_number: int
+    finalized: bool
+    groups: tuple
+    suits: tuple
+    stats: MappingProxyType
+
+    @property
+    def first_group(self):
+        return self.groups[0] if self.groups else None
+
+    @property
+    def first_suits(self):
+        return self.suits[0] if self.suits else None
+
+
+def normalize(group_str: str) -> str:
+    """Remplace les variantes de symboles (❤️, ♥️, ♠️...) par le costume simple."""
+    return (group_str.replace('❤️', '♥').replace('❤', '♥').replace('♥️', '♥')
+            .replace('♠️', '♠').replace('♦️', '♦').replace('♣️', '♣'))
+
+
+def _parse_stats(message: str):
+    if ':' not in message:
+        return _EMPTY_STATS
+    stats = {}
+    for suit, value in STATS_RE.findall(message):
+        if suit not in stats:
+            stats[suit] = int(value)
+    return MappingProxyType(stats) if stats else _EMPTY_STATS
+
+
+@lru_cache(maxsize=512)
+def parse_message(message: str) -> ParsedMessage:
+    """
+    Analyse un texte une seule fois; le résultat est mis en cache pour que
+    R1, R2 et la vérification des résultats partagent le même enregistrement.
+    """
+    match = GAME_RE.search(message)
+    groups = tuple(GROUP_RE.findall(message))
+    finalized = '⏰' not in message and (
+        '✅' in message or '🔰' in message or '▶️' in message or 'Finalisé' in message
+    )
+    return ParsedMessage(
+        game_number=int(match.group(1)) if match else None,
+        finalized=finalized,
+        groups=groups,
+        suits=tuple([normalize(g) for g in groups]),
+        stats=_parse_stats(message),
+    )
@@ -0,0 +1,133 @@
+"""
+Structures indexées pour les prédictions en file d'attente et en cours
+"""
+from bisect import bisect_left, insort
+
+
+class PredictionQueue(dict):
+    """
+    queued_predictions: {jeu cible: données} avec les clés maintenues triées,
+    pour obtenir les cibles >= jeu courant sans trier toute la file à chaque
+    message (recherche O(log n)).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._keys = []
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, game, data):
+        if game not in self:
+            insort(self._keys, game)
+        super().__setitem__(game, data)
+
+    def __delitem__(self, game):
+        super().__delitem__(game)
+        self._keys.pop(bisect_left(self._keys, game))
+
+    def pop(self, game, *default):
+        if game in self:
+            data = super().__getitem__(game)
+            del self[game]
+            return data
+        if default:
+            return default[0]
+        raise KeyError(game)
+
+    def popitem(self):
+        game = self._keys[-1]
+        return game, self.pop(game)
+
+    def update(self, *args, **kwargs):
+        for game, data in dict(*args, **kwargs).items():
+            self[game] = data
+
+    def setdefault(self, game, default=None):
+        if game not in self:
+            self[game] = default
+        return self[game]
+
+    def clear(self):
+        super().clear()
+        self._keys.clear()
+
+    def ready(self, current_game: int) -> list:
+        """Cibles >= current_game, dans l'ordre croissant (copie)."""
+        return self._keys[bisect_left(self._keys, current_game):]
+
+    def first(self):
+        return self._keys[0] if self._keys else None
+
+
+class PendingIndex(dict):
+    """
+    pending_predictions avec index secondaires par type de règle et par
+    niveau de rattrapage (jeux triés). rule_type et rattrapage sont fixés à
+    l'insertion.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._by_level = {}
+        self.update(*args, **kwargs)
+
+    @staticmethod
+    def _key(data):
+        return data.get('rule_type'), data.get('rattrapage', 0)
+
+    def _unindex(self, game):
+        key = self._key(super().__getitem__(game))
+        games = self._by_level.get(key)
+        if games is not None:
+            i = bisect_left(games, game)
+            if i < len(games) and games[i] == game:
+                games.pop(i)
+            if not games:
+                del self._by_level[key]
+
+    def __setitem__(self, game, data):
+        if game in self:
+            self._unindex(game)
+        super().__setitem__(game, data)
+        insort(self._by_level.setdefault(self._key(data), []), game)
+
+    def __delitem__(self, game):
+        self._unindex(game)
+        super().__delitem__(game)
+
+    def pop(self, game, *default):
+        if game in self:
+            data = super().__getitem__(game)
+            del self[game]
+            return data
+        if default:
+            return default[0]
+        raise KeyError(game)
+
+    def popitem(self):
+        game = next(reversed(self))
+        return game, self.pop(game)
+
+    def update(self, *args, **kwargs):
+        for game, data in dict(*args, **kwargs).items():
+            self[game] = data
+
+    def setdefault(self, game, default=None):
+        if game not in self:
+            self[game] = default
+        return self[game]
+
+    def clear(self):
+        super().clear()
+        self._by_level.clear()
+
+    def games(self, rule_type: str, rattrapage: int = None) -> set:
+        """Jeux en cours pour une règle (et un niveau de rattrapage si précisé)."""
+        if rattrapage is not None:
+            return set(self._by_level.get((rule_type, rattrapage), ()))
+        return {g for (rule, _), games in self._by_level.items() if rule == rule_type for g in games}
+
+    def has_primary_after(self, rule_type: str, current_game: int) -> bool:
+        """Existe-t-il une prédiction principale (rattrapage 0) de cette règle après current_game?"""
+        games = self._by_level.get((rule_type, 0))
+        return bool(games) and games[-1] > current_game
@@ -0,0 +1,142 @@
+"""
+Planificateur d'échéances unique (timeouts paiement, fins d'essai et
+d'abonnement): un tas trié par échéance, persisté dans la base SQLite, et une
+seule tâche qui ne se réveille qu'à la prochaine échéance.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """
+    Tâches {clé: (échéance, type, données)}. Une clé identifie une tâche
+    unique (ex: 'payment:123'): replanifier la remplace, cancel() l'annule.
+    Les handlers sont enregistrés par type avec @scheduler.handler('type')
+    et appelés avec (clé, données).
+    """
+
+    def __init__(self, clock, store=None):
+        self.clock = clock
+        self.store = store
+        self.handlers = {}
+        self.fired = 0
+        self.cancelled = 0
+        self._jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = None
+
+    def handler(self, kind: str):
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    def attach(self, store):
+        """Branche le stockage et recharge les échéances persistées (redémarrage, promotion)."""
+        self.store = store
+        self._jobs.clear()
+        self._heap.clear()
+        for key, kind, due, payload in store.load_deadlines():
+            self._push(key, due, kind, payload)
+        if self._jobs:
+            logger.info(f"⏰ {len(self._jobs)} échéances restaurées")
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __contains__(self, key):
+        return key in self._jobs
+
+    def due_of(self, key: str):
+        job = self._jobs.get(key)
+        return job[0] if job else None
+
+    def _push(self, key, due: float, kind: str, payload):
+        seq = next(self._seq)
+        self._jobs[key] = (due, seq, kind, payload)
+        heapq.heappush(self._heap, (due, seq, key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def schedule(self, key: str, due, kind: str, payload=None):
+        """Planifie (ou replanifie) `key` à `due` (datetime ou timestamp)."""
+        if isinstance(due, datetime):
+            due = due.timestamp()
+        self._push(key, due, kind, payload)
+        if self.store is not None:
+            self.store.save_deadline(key, kind, due, payload)
+
+    def cancel(self, key: str) -> bool:
+        # Entrée du tas laissée en place, ignorée à l'échéance (suppression paresseuse)
+        if self._jobs.pop(key, None) is None:
+            return False
+        self.cancelled += 1
+        if self.store is not None:
+            self.store.delete_deadline(key)
+        return True
+
+    def cancel_prefix(self, prefix: str) -> int:
+        """Annule toutes les tâches dont la clé commence par `prefix` (ex: 'payment:')."""
+        keys = [key for key in self._jobs if key.startswith(prefix)]
+        for key in keys:
+            self.cancel(key)
+        return len(keys)
+
+    def next_due(self):
+        heap = self._heap
+        while heap:
+            due, seq, key = heap[0]
+            job = self._jobs.get(key)
+            if job is not None and job[1] == seq:
+                return due
+            heapq.heappop(heap)
+        return None
+
+    def pop_due(self, now: float) -> list:
+        """Retire et renvoie [(clé, type, données)] des tâches échues à `now`."""
+        due_jobs = []
+        while True:
+            due = self.next_due()
+            if due is None or due > now:
+                return due_jobs
+            _, _, key = heapq.heappop(self._heap)
+            _, _, kind, payload = self._jobs.pop(key)
+            if self.store is not None:
+                self.store.delete_deadline(key)
+            due_jobs.append((key, kind, payload))
+
+    async def _fire(self, key: str, kind: str, payload):
+        handler = self.handlers.get(kind)
+        if handler is None:
+            logger.warning(f"Échéance {key}: aucun handler pour '{kind}'")
+            return
+        try:
+            await handler(key, payload)
+        except Exception as e:
+            logger.error(f"Erreur échéance {key} ({kind}): {e}")
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            now = self.clock.now().timestamp()
+            for key, kind, payload in self.pop_due(now):
+                self.fired += 1
+                asyncio.create_task(self._fire(key, kind, payload))
+
+            self._wakeup.clear()
+            waiters = [asyncio.create_task(self._wakeup.wait())]
+            due = self.next_due()
+            if due is not None:
+                waiters.append(asyncio.create_task(self.clock.sleep(due - now)))
+            try:
+                # Réveil à la prochaine échéance, ou plus tôt si une échéance plus proche est planifiée
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
@@ -0,0 +1,432 @@
+"""
+Diffusion répartie sur plusieurs processus d'envoi (mode optionnel,
+SENDER_WORKERS > 0): chaque worker possède une partition des user_id
+(hachage stable) et sa propre connexion Telegram. Le bot publie chaque
+diffusion sur un socket Unix local (une ligne JSON par message) et les
+workers renvoient les {user_id: message_id} nécessaires aux éditions, au
+fil de l'eau (accusés partiels) puis dans le rapport final.
+
+Lancement d'un worker (fait par SenderPool):
+    python sender_pool.py --socket CHEMIN --shard I --shards N [--rate R] [--stub]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import zlib
+from types import SimpleNamespace
+
+from broadcast import BroadcastReport
+
+logger = logging.getLogger(__name__)
+
+# Les réponses contiennent un message_id par destinataire de la partition
+IPC_LIMIT = 64 * 1024 * 1024
+RESPAWN_DELAY = 5.0
+# Accusés partiels (et signe de vie) d'un worker pendant une diffusion
+ACK_INTERVAL = 0.5
+# Sans aucune nouvelle du worker pendant ce délai, la requête est abandonnée
+REQUEST_IDLE_TIMEOUT = 30.0
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    """Partition d'un utilisateur, stable entre processus et redémarrages."""
+    return zlib.crc32(str(user_id).encode()) % shards
+
+
+def partition(recipients, shards: int) -> dict:
+    """{partition: [user_id]} en conservant l'ordre (admin en premier)."""
+    parts = {}
+    for user_id in recipients:
+        parts.setdefault(shard_of(user_id, shards), []).append(user_id)
+    return parts
+
+
+_remote_errors = {}
+
+
+class WorkerError(Exception):
+    """Erreur d'envoi survenue dans un worker (sous-classe nommée comme l'originale)."""
+
+
+def remote_error(name: str, message: str) -> WorkerError:
+    # Même nom de classe que l'exception du worker: ErrorSampler regroupe correctement
+    cls = _remote_errors.get(name)
+    if cls is None:
+        cls = _remote_errors[name] = type(name, (WorkerError,), {})
+    return cls(message)
+
+
+def _encode(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def report_to_reply(request_id: int, report: BroadcastReport) -> dict:
+    """Rapport d'un worker; les instants sont relatifs au début (horloges distinctes)."""
+    started = report.started_at
+    return {
+        'id': request_id,
+        'results': {str(uid): msg_id for uid, msg_id in report.results.items()},
+        'errors': {str(uid): [type(e).__name__, str(e)] for uid, e in report.errors.items()},
+        'flood_waits': report.flood_waits,
+        'flood_wait_seconds': report.flood_wait_seconds,
+        'first': None if report.first_at is None else report.first_at - started,
+        'last': None if report.last_at is None else report.last_at - started,
+    }
+
+
+def reply_to_report(reply: dict, started: float) -> BroadcastReport:
+    report = BroadcastReport(started_at=started)
+    report.results = {int(uid): msg_id for uid, msg_id in reply['results'].items()}
+    report.errors = {int(uid): remote_error(name, message) for uid, (name, message) in reply['errors'].items()}
+    report.flood_waits = reply['flood_waits']
+    report.flood_wait_seconds = reply['flood_wait_seconds']
+    if reply['first'] is not None:
+        report.first_at = started + reply['first']
+        report.last_at = started + reply['last']
+    return report
+
+
+def merge_reports(reports, started: float, finished: float) -> BroadcastReport:
+    merged = BroadcastReport(started_at=started, finished_at=finished)
+    for report in reports:
+        merged.results.update(report.results)
+        merged.errors.update(report.errors)
+        merged.flood_waits += report.flood_waits
+        merged.flood_wait_seconds += report.flood_wait_seconds
+        if report.first_at is not None:
+            if merged.first_at is None or report.first_at < merged.first_at:
+                merged.first_at = report.first_at
+            if merged.last_at is None or report.last_at > merged.last_at:
+                merged.last_at = report.last_at
+    return merged
+
+
+# ============ CÔTÉ BOT ============
+class _WorkerConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.progress = {}
+        self.last_seen = time.monotonic()
+
+    async def request(self, payload: dict, idle_timeout: float = REQUEST_IDLE_TIMEOUT) -> dict:
+        """
+        Rapport final du worker. TimeoutError si le worker ne donne plus
+        signe de vie pendant `idle_timeout`; en cas d'échec, les envois déjà
+        accusés restent disponibles via acknowledged().
+        """
+        request_id = payload['id']
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.progress[request_id] = []
+        sent_at = time.monotonic()
+        try:
+            self.writer.write(_encode(payload))
+            await self.writer.drain()
+            while True:
+                try:
+                    reply = await asyncio.wait_for(asyncio.shield(future), idle_timeout)
+                    break
+                except asyncio.TimeoutError:
+                    if time.monotonic() - max(self.last_seen, sent_at) >= idle_timeout:
+                        raise TimeoutError(f"aucune nouvelle depuis {idle_timeout:.0f}s")
+            self.progress.pop(request_id, None)
+            return reply
+        finally:
+            self.pending.pop(request_id, None)
+
+    def acknowledged(self, request_id: int, started: float) -> BroadcastReport:
+        """Envois accusés par le worker avant l'échec d'une requête."""
+        replies = self.progress.pop(request_id, [])
+        return merge_reports([reply_to_report(reply, started) for reply in replies], started, started)
+
+    async def read_replies(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            self.last_seen = time.monotonic()
+            reply = json.loads(line)
+            request_id = reply.get('id')
+            if reply.get('op') == 'progress':
+                if reply['results'] and request_id in self.progress:
+                    self.progress[request_id].append(reply)
+                continue
+            future = self.pending.get(request_id)
+            if future is not None and not future.done():
+                future.set_result(reply)
+
+    def fail_pending(self, error: Exception):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+
+class SenderPool:
+    """
+    Lance et supervise `workers` processus d'envoi. broadcast() découpe les
+    destinataires par partition; une partition dont le worker n'est pas
+    connecté est envoyée localement par `fallback(user_ids)`. Si un worker
+    tombe (ou ne répond plus) en cours de diffusion, seuls les destinataires
+    dont l'envoi n'a pas été accusé sont renvoyés localement.
+    """
+
+    def __init__(self, workers: int, clock, socket_path: str = None, worker_args=()):
+        self.workers = workers
+        self.clock = clock
+        self.socket_path = socket_path or os.path.join(
+            tempfile.gettempdir(), f'sender_pool_{os.getpid()}.sock')
+        self.worker_args = list(worker_args)
+        self.request_timeout = REQUEST_IDLE_TIMEOUT
+        self.respawns = 0
+        self.fallbacks = 0
+        self._connections = {}
+        self._processes = {}
+        self._ids = itertools.count(1)
+        self._server = None
+
+    @property
+    def connected(self) -> int:
+        return len(self._connections)
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(
+            self._on_connect, path=self.socket_path, limit=IPC_LIMIT)
+
+    async def wait_connected(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while self.connected < self.workers:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{self.connected}/{self.workers} workers d'envoi connectés")
+            await asyncio.sleep(0.05)
+
+    async def _on_connect(self, reader, writer):
+        try:
+            hello = json.loads(await reader.readline())
+        except ValueError:
+            writer.close()
+            return
+        shard = hello['shard']
+        connection = _WorkerConnection(reader, writer)
+        self._connections[shard] = connection
+        logger.info(f"🧵 Worker d'envoi {shard}/{self.workers} connecté")
+        try:
+            await connection.read_replies()
+        except (ConnectionError, ValueError) as e:
+            logger.error(f"Worker d'envoi {shard}: flux IPC interrompu ({e})")
+        finally:
+            if self._connections.get(shard) is connection:
+                del self._connections[shard]
+            connection.fail_pending(ConnectionError(f"worker {shard} déconnecté"))
+            writer.close()
+            logger.warning(f"Worker d'envoi {shard} déconnecté")
+
+    async def _supervise(self, shard: int):
+        while True:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, WORKER_SCRIPT,
+                '--socket', self.socket_path, '--shard', str(shard), '--shards', str(self.workers),
+                *self.worker_args)
+            self._processes[shard] = process
+            code = await process.wait()
+            self.respawns += 1
+            logger.warning(f"Worker d'envoi {shard} arrêté (code {code}), redémarrage dans {RESPAWN_DELAY:.0f}s")
+            await self.clock.sleep(RESPAWN_DELAY)
+
+    async def run(self):
+        if self._server is None:
+            await self.start()
+        try:
+            await asyncio.gather(*(self._supervise(shard) for shard in range(self.workers)))
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for process in self._processes.values():
+            if process.returncode is None:
+                process.terminate()
+        for process in self._processes.values():
+            await process.wait()
+        self._processes.clear()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _terminate(self, shard: int):
+        process = self._processes.get(shard)
+        if process is not None and process.returncode is None:
+            process.terminate()
+
+    async def broadcast(self, recipients, text: str, fallback) -> BroadcastReport:
+        started = self.clock.monotonic()
+
+        async def send_shard(shard, user_ids):
+            partial = None
+            connection = self._connections.get(shard)
+            if connection is not None:
+                request_id = next(self._ids)
+                payload = {'op': 'send', 'id': request_id, 'text': text, 'users': user_ids}
+                try:
+                    return reply_to_report(await connection.request(payload, self.request_timeout), started)
+                except (ConnectionError, OSError) as e:
+                    logger.warning(f"Worker d'envoi {shard} indisponible ({e})")
+                    if isinstance(e, TimeoutError):
+                        # Un worker bloqué ne doit pas continuer d'envoyer en parallèle du renvoi
+                        self._terminate(shard)
+                    partial = connection.acknowledged(request_id, started)
+                    user_ids = [uid for uid in user_ids if uid not in partial.results]
+            self.fallbacks += 1
+            logger.warning(f"Partition {shard}: envoi local de {len(user_ids)} messages")
+            report = await fallback(user_ids) if user_ids else BroadcastReport(started_at=started)
+            if partial is None:
+                return report
+            return merge_reports([partial, report], started, self.clock.monotonic())
+
+        parts = partition(recipients, self.workers)
+        reports = await asyncio.gather(*(send_shard(shard, ids) for shard, ids in parts.items()))
+        return merge_reports(reports, started, self.clock.monotonic())
+
+
+# ============ CÔTÉ WORKER ============
+class StubSender:
+    """
+    Client factice pour les essais locaux: `latency` simule l'aller-retour
+    réseau, `cpu` le coût de sérialisation/chiffrement d'un envoi (attente active).
+    """
+
+    def __init__(self, latency: float = 0.0, cpu: float = 0.0):
+        self.latency = latency
+        self.cpu = cpu
+        self._ids = itertools.count(1)
+
+    async def send_message(self, user_id, text, **kwargs):
+        if self.cpu:
+            end = time.perf_counter() + self.cpu
+            while time.perf_counter() < end:
+                pass
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return SimpleNamespace(id=next(self._ids))
+
+
+async def serve_worker(socket_path: str, shard: int, client, engine):
+    """Boucle d'un worker: une diffusion par requête, traitées en parallèle."""
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=IPC_LIMIT)
+    writer.write(_encode({'op': 'hello', 'shard': shard, 'pid': os.getpid()}))
+    await writer.drain()
+    write_lock = asyncio.Lock()
+    tasks = set()
+
+    async def write(payload: dict):
+        async with write_lock:
+            writer.write(_encode(payload))
+            await writer.drain()
+
+    async def handle(request):
+        text = request['text']
+        clock = engine.flood.clock
+        # Envois réussis depuis le dernier accusé partiel
+        acked = BroadcastReport(started_at=clock.monotonic())
+
+        async def send_one(user_id):
+            sent_msg = await client.send_message(user_id, text)
+            now = clock.monotonic()
+            if acked.first_at is None:
+                acked.first_at = now
+            acked.last_at = now
+            acked.results[user_id] = sent_msg.id
+            return sent_msg.id
+
+        async def report_progress():
+            # Envoyé même vide: signe de vie pendant les FloodWait
+            while True:
+                await asyncio.sleep(ACK_INTERVAL)
+                progress = report_to_reply(request['id'], acked)
+                progress['op'] = 'progress'
+                acked.results = {}
+                await write(progress)
+
+        reporter = asyncio.create_task(report_progress())
+        try:
+            report = await engine.run(request['users'], send_one)
+        finally:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+        await write(report_to_reply(request['id'], report))
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            # Le bot s'est arrêté: le worker aussi
+            break
+        task = asyncio.create_task(handle(json.loads(line)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    writer.close()
+
+
+async def _worker_main(args):
+    from config import (
+        API_ID, API_HASH, BOT_TOKEN, BOT_CLOCK, BROADCAST_CONCURRENCY,
+        BROADCAST_GLOBAL_RATE, BROADCAST_PER_CHAT_INTERVAL, BROADCAST_MAX_RETRIES
+    )
+    from broadcast import BroadcastEngine, FloodControl
+    from clock import make_clock
+
+    clock = make_clock(BOT_CLOCK)
+    # Même jeton bot pour tous les workers: le budget global est partagé entre les partitions
+    rate = args.rate or BROADCAST_GLOBAL_RATE / args.shards
+    flood = FloodControl(rate, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL, clock=clock)
+    engine = BroadcastEngine(flood, BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES)
+
+    if args.stub:
+        client = StubSender(args.stub_latency, args.stub_cpu)
+        await serve_worker(args.socket, args.shard, client, engine)
+        return
+
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+    client = TelegramClient(StringSession(), API_ID, API_HASH, receive_updates=False)
+    await client.start(bot_token=BOT_TOKEN)
+    logger.info(f"✅ Worker d'envoi {args.shard}/{args.shards} connecté à Telegram")
+    try:
+        await serve_worker(args.socket, args.shard, client, engine)
+    finally:
+        await client.disconnect()
+
+
+def worker_main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker d'envoi des prédictions (une partition)")
+    parser.add_argument('--socket', required=True)
+    parser.add_argument('--shard', type=int, required=True)
+    parser.add_argument('--shards', type=int, required=True)
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help="messages/s de ce worker (défaut: BROADCAST_GLOBAL_RATE / shards)")
+    parser.add_argument('--stub', action='store_true', help="client factice (essais locaux)")
+    parser.add_argument('--stub-latency', type=float, default=0.0)
+    parser.add_argument('--stub-cpu', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    from config import LOG_LEVEL, LOG_LEVELS
+    from log_setup import setup_logging
+    setup_logging(LOG_LEVEL, LOG_LEVELS)
+    try:
+        asyncio.run(_worker_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    worker_main()
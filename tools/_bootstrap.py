@@ -0,0 +1,21 @@
+"""
+Import de main.py hors production (outils, bancs d'essai): identifiants
+factices, aucune connexion Telegram n'est ouverte.
+"""
+import logging
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def load_main(log_level=logging.WARNING):
+    os.environ.setdefault('API_ID', '1')
+    os.environ.setdefault('API_HASH', 'offline')
+    os.environ.setdefault('BOT_TOKEN', '1:offline')
+    os.environ.setdefault('ADMIN_ID', '1')
+    import main
+    logging.getLogger().setLevel(log_level)
+    return main
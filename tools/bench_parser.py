@@ -0,0 +1,119 @@
+"""
+Micro-benchmark: parse_message (analyse unique) contre les anciennes
+fonctions d'analyse appelées séparément par les handlers.
+
+    python tools/bench_parser.py [--corpus export.jsonl] [--repeat 5]
+"""
+import argparse
+import re
+import time
+
+from _bootstrap import ROOT  # noqa: F401  (ajoute la racine au sys.path)
+from corpus import load_corpus, synthetic_corpus
+from message_parser import parse_message, normalize
+
+
+# ---- Anciennes versions (avant message_parser), reprises telles quelles ----
+def old_extract_game_number(message):
+    match = re.search(r"#N\s*(\d+)", message, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def old_parse_stats_message(message):
+    stats = {}
+    patterns = {
+        '♠': r'♠️?\s*:\s*(\d+)',
+        '♥': r'♥️?\s*:\s*(\d+)',
+        '♦': r'♦️?\s*:\s*(\d+)',
+        '♣': r'♣️?\s*:\s*(\d+)'
+    }
+    for suit, pattern in patterns.items():
+        match = re.search(pattern, message)
+        if match:
+            stats[suit] = int(match.group(1))
+    return stats
+
+
+def old_extract_parentheses_groups(message):
+    return re.findall(r"\(([^)]*)\)", message)
+
+
+def old_normalize_suits(group_str):
+    normalized = group_str.replace('❤️', '♥').replace('❤', '♥').replace('♥️', '♥')
+    normalized = normalized.replace('♠️', '♠').replace('♦️', '♦').replace('♣️', '♣')
+    return normalized
+
+
+def old_is_message_finalized(message):
+    if '⏰' in message:
+        return False
+    return '✅' in message or '🔰' in message or '▶️' in message or 'Finalisé' in message
+
+
+def old_pipeline(message):
+    """
+    Chemin d'un message dans handle_message avant message_parser: R1,
+    test finalisé, process_finalized_message puis process_stats_message
+    (le texte est réanalysé à chaque étape).
+    """
+    old_extract_game_number(message)
+    if old_is_message_finalized(message):
+        if old_is_message_finalized(message):
+            old_extract_game_number(message)
+            groups = old_extract_parentheses_groups(message)
+            if groups:
+                old_normalize_suits(groups[0])
+    old_parse_stats_message(message)
+
+
+def new_pipeline(message):
+    parse_message(message).game_number
+    if parse_message(message).finalized:
+        parsed = parse_message(message)
+        parsed.game_number
+        parsed.first_suits
+    parse_message(message).stats
+
+
+def check_equivalence(corpus):
+    for message in corpus:
+        parsed = parse_message(message)
+        assert parsed.game_number == old_extract_game_number(message), message
+        assert parsed.finalized == old_is_message_finalized(message), message
+        assert list(parsed.groups) == old_extract_parentheses_groups(message), message
+        assert list(parsed.suits) == [old_normalize_suits(g) for g in parsed.groups], message
+        assert dict(parsed.stats) == old_parse_stats_message(message), message
+        assert normalize(message) == old_normalize_suits(message), message
+
+
+def bench(fn, corpus, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        parse_message.cache_clear()
+        start = time.perf_counter()
+        for message in corpus:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', help="export JSONL des canaux sources (clé 'text')")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    check_equivalence(corpus)
+    # Chaque publication finalisée est reçue en NewMessage puis en MessageEdited
+    corpus = [m for message in corpus for m in (message, message)]
+
+    old_us = bench(old_pipeline, corpus, args.repeat)
+    new_us = bench(new_pipeline, corpus, args.repeat)
+    print(f"Corpus: {len(corpus)} messages reçus (nouveaux + édités, équivalence vérifiée)")
+    print(f"Anciennes fonctions : {old_us:8.2f} µs/message")
+    print(f"parse_message       : {new_us:8.2f} µs/message  (x{old_us / new_us:.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Banc d'essai de la diffusion répartie: débit d'une diffusion envoyée par
+1..N processus d'envoi (sender_pool) avec un client factice.
+
+    python tools/bench_senders.py [--users 10000] [--workers 1,2,4] [--cpu 0.0002] [--latency 0.02]
+
+--cpu simule le coût CPU d'un envoi Telethon (sérialisation, chiffrement),
+qui plafonne un processus unique; --latency l'aller-retour réseau.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from _bootstrap import ROOT  # noqa: F401  (ajoute la racine au sys.path)
+from clock import SystemClock
+from sender_pool import SenderPool
+
+
+async def bench(workers: int, users: int, args) -> tuple:
+    pool = SenderPool(workers, SystemClock(), worker_args=[
+        '--stub', '--stub-cpu', str(args.cpu), '--stub-latency', str(args.latency)])
+    runner = asyncio.create_task(pool.run())
+    try:
+        await pool.wait_connected()
+        recipients = list(range(1, users + 1))
+
+        async def no_fallback(user_ids):
+            raise RuntimeError(f"worker absent ({len(user_ids)} destinataires)")
+
+        start = time.perf_counter()
+        report = await pool.broadcast(recipients, "🎰 PRÉDICTION #100", no_fallback)
+        elapsed = time.perf_counter() - start
+        return report, elapsed
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--cpu', type=float, default=0.0002, help="secondes CPU par envoi")
+    parser.add_argument('--latency', type=float, default=0.02, help="secondes réseau par envoi")
+    args = parser.parse_args()
+
+    # Limites anti-flood levées: seul le coût des envois est mesuré
+    os.environ['BROADCAST_GLOBAL_RATE'] = '1000000'
+    os.environ['BROADCAST_PER_CHAT_INTERVAL'] = '0'
+    os.environ.setdefault('BROADCAST_CONCURRENCY', '200')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    logging.getLogger('sender_pool').setLevel(logging.ERROR)
+
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(',')):
+        report, elapsed = asyncio.run(bench(workers, args.users, args))
+        rate = report.sent / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>2} worker(s): {report.sent:>7} envoyés, {report.failed} échecs "
+              f"en {elapsed:6.2f}s | {rate:9,.0f} msg/s (x{rate / baseline:.2f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Micro-benchmarks des fonctions chaudes du bot, avec baseline JSON et
+rapport de comparaison (régressions au-delà d'un seuil).
+
+    python tools/bench_suite.py --save                 # enregistre la baseline
+    python tools/bench_suite.py                        # compare à la baseline
+    python tools/bench_suite.py --only suit,signature --threshold 0.2
+
+Code de sortie 1 si une régression est détectée (utilisable en CI).
+Les baselines dépendent de la machine: à générer sur la machine de mesure.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from _bootstrap import ROOT, load_main
+from corpus import synthetic_corpus
+from loadtest import synthetic_users
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'tools', 'bench_baseline.json')
+# Numéros de jeu d'une journée (jusqu'à ~1440 jeux)
+GAME_RANGE = range(6, 1441)
+
+
+class Bench:
+    """`run()` traite un lot de `ops` opérations; `before()` est appelé avant chaque mesure."""
+
+    def __init__(self, name: str, run, ops: int, before=None, repeat: int = None, cleanup=None):
+        self.name = name
+        self.run = run
+        self.ops = ops
+        self.before = before
+        self.repeat = repeat
+        self.cleanup = cleanup
+
+    def measure(self, repeat: int) -> dict:
+        samples = []
+        try:
+            for _ in range(self.repeat or repeat):
+                if self.before is not None:
+                    self.before()
+                start = time.perf_counter()
+                self.run()
+                samples.append((time.perf_counter() - start) / self.ops * 1e6)
+        finally:
+            if self.cleanup is not None:
+                self.cleanup()
+        return {'us_per_op': min(samples), 'median_us': statistics.median(samples), 'ops': self.ops}
+
+
+def parser_benches(bot) -> list:
+    corpus = synthetic_corpus(3000)
+    sources = [m for m in corpus if '#N' in m]
+    stats = [m for m in corpus if 'STATISTIQUES' in m]
+    groups = [g for m in sources for g in bot.parse_message(m).groups]
+    clear = bot.parse_message.cache_clear
+
+    def extract():
+        for message in sources:
+            bot.extract_game_number(message)
+
+    def parse_stats():
+        for message in stats:
+            bot.parse_stats_message(message)
+
+    def normalize():
+        for group in groups:
+            bot.normalize_suits(group)
+
+    def has_suit():
+        for group in groups:
+            bot.has_suit_in_group(group, '♠')
+
+    return [
+        Bench('extract_game_number', extract, len(sources), clear),
+        Bench('parse_stats_message', parse_stats, len(stats), clear),
+        Bench('normalize_suits', normalize, len(groups)),
+        Bench('has_suit_in_group', has_suit, len(groups)),
+    ]
+
+
+def rule_benches(bot) -> list:
+    cycle = len(bot.TIME_CYCLE)
+
+    def suits():
+        for n in GAME_RANGE:
+            bot.get_suit_for_number(n)
+
+    def signatures():
+        for i, n in enumerate(GAME_RANGE):
+            bot.calculate_signature(n, i % cycle)
+
+    return [
+        Bench('get_suit_for_number', suits, len(GAME_RANGE)),
+        Bench('calculate_signature', signatures, len(GAME_RANGE)),
+    ]
+
+
+def user_benches(bot, sizes) -> list:
+    benches = []
+    for size in sizes:
+        users = synthetic_users(size, bot.clock.now())
+        ids = [int(uid) for uid in users]
+
+        def install(users=users):
+            bot.users_data = users
+            bot.rebuild_eligibility_index()
+
+        def can_receive(ids=ids):
+            for user_id in ids:
+                bot.can_receive_predictions(user_id)
+
+        benches.append(Bench(f'can_receive_predictions[{size}]', can_receive, size, install))
+
+        # Base SQLite temporaire, créée à la première mesure
+        workdir = {}
+
+        def install_store(users=users, workdir=workdir):
+            if bot.user_store is None:
+                workdir['path'] = tempfile.mkdtemp(prefix='bench_users_')
+                bot.user_store = bot.UserStore(os.path.join(workdir['path'], 'users.db'))
+                bot.users_writer = bot.WriteBehind(bot.user_store, bot.USERS_FLUSH_INTERVAL)
+            bot.users_data = users
+
+        def remove_store(workdir=workdir):
+            if bot.user_store is not None:
+                bot.user_store.close()
+            bot.user_store = None
+            bot.users_writer = None
+            if 'path' in workdir:
+                shutil.rmtree(workdir.pop('path'), ignore_errors=True)
+
+        benches.append(Bench(f'save_users_data[{size}]', bot.save_users_data, size, install_store,
+                             repeat=3, cleanup=remove_store))
+    return benches
+
+
+def flush_benches(bot, sizes, dirty_counts) -> list:
+    """WriteBehind.flush de `count` utilisateurs modifiés dans une base de `size` (chemin courant)."""
+    benches = []
+    for size in sizes:
+        users = synthetic_users(size, bot.clock.now())
+        ids = list(users)
+        for count in (c for c in dirty_counts if c <= size):
+            # Base peuplée et boucle asyncio créées à la première mesure
+            state = {}
+            dirty = ids[::size // count][:count]
+
+            def mark_dirty(users=users, dirty=dirty, state=state):
+                if not state:
+                    state['path'] = tempfile.mkdtemp(prefix='bench_flush_')
+                    state['store'] = bot.UserStore(os.path.join(state['path'], 'users.db'))
+                    state['store'].replace_all(users)
+                    state['writer'] = bot.WriteBehind(state['store'])
+                    state['loop'] = asyncio.new_event_loop()
+                    state['round'] = 0
+                state['round'] += 1
+                for user_id in dirty:
+                    state['writer'].mark(user_id, dict(users[user_id], bench_round=state['round']))
+
+            def flush(state=state):
+                state['loop'].run_until_complete(state['writer'].flush())
+
+            def remove(state=state):
+                if state:
+                    state['store'].close()
+                    state['loop'].close()
+                    shutil.rmtree(state['path'], ignore_errors=True)
+                    state.clear()
+
+            benches.append(Bench(f'write_behind_flush[{count}/{size}]', flush, count, mark_dirty,
+                                 cleanup=remove))
+    return benches
+
+
+def load_baseline(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: dict):
+    # Un enregistrement partiel (--only) complète la baseline existante
+    previous = load_baseline(path)
+    if previous is not None:
+        results = dict(previous.get('results', {}), **results)
+    data = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> tuple:
+    """Lignes du rapport et liste des régressions (rapport courant / baseline)."""
+    lines = []
+    regressions = []
+    reference = baseline['results']
+    for name, current in results.items():
+        base = reference.get(name)
+        if base is None:
+            lines.append(f"  {name:<32} {current['us_per_op']:10.3f} µs/op   (nouveau)")
+            continue
+        ratio = current['us_per_op'] / base['us_per_op']
+        if ratio > 1 + threshold:
+            flag = '❌ régression'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = '✅ amélioration'
+        else:
+            flag = ''
+        lines.append(f"  {name:<32} {current['us_per_op']:10.3f} µs/op   baseline {base['us_per_op']:10.3f}"
+                     f"   x{ratio:5.2f}  {flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="enregistre les résultats comme baseline")
+    parser.add_argument('--threshold', type=float, default=0.10, help="écart toléré (0.10 = 10%%)")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--users', default='1000,10000,100000', help="tailles pour les benchs utilisateurs")
+    parser.add_argument('--dirty', default='1,100,1000', help="utilisateurs modifiés par WriteBehind.flush")
+    parser.add_argument('--only', help="filtre sur les noms (sous-chaînes séparées par des virgules)")
+    args = parser.parse_args()
+
+    bot = load_main(logging.ERROR)
+    sizes = [int(s) for s in args.users.split(',') if s.strip()]
+    dirty = [int(s) for s in args.dirty.split(',') if s.strip()]
+    benches = (parser_benches(bot) + rule_benches(bot) + user_benches(bot, sizes)
+               + flush_benches(bot, sizes, dirty))
+    if args.only:
+        keys = [k.strip() for k in args.only.split(',') if k.strip()]
+        benches = [b for b in benches if any(k in b.name for k in keys)]
+
+    results = {}
+    for bench in benches:
+        results[bench.name] = bench.measure(args.repeat)
+        print(f"  {bench.name:<32} {results[bench.name]['us_per_op']:10.3f} µs/op "
+              f"(médiane {results[bench.name]['median_us']:.3f}, {bench.ops} ops)", flush=True)
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"Baseline enregistrée: {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"Pas de baseline ({args.baseline}): relancer avec --save pour l'enregistrer")
+        return
+    lines, regressions = compare(results, baseline, args.threshold)
+    meta = baseline.get('meta', {})
+    print(f"\nComparaison à la baseline du {meta.get('created', '?')} (Python {meta.get('python', '?')}), "
+          f"seuil ±{args.threshold:.0%}:")
+    print('\n'.join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} régression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
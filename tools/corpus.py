@@ -0,0 +1,88 @@
+"""
+Messages représentatifs des canaux sources (même format que les publications
+réelles), pour les bancs d'essai et la relecture hors ligne.
+"""
+import json
+import random
+
+CARDS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+SUIT_GLYPHS = ['♠️', '♥️', '♦️', '♣️', '❤️']
+STATS_GLYPHS = ['♠️', '♥️', '♦️', '♣️']
+
+
+def _hand(rng: random.Random, size: int) -> str:
+    return ''.join(rng.choice(CARDS) + rng.choice(SUIT_GLYPHS) for _ in range(size))
+
+
+def source_message(rng: random.Random, game: int, finalized: bool) -> str:
+    player = _hand(rng, rng.choice((2, 3)))
+    banker = _hand(rng, rng.choice((2, 3)))
+    p, b = rng.randint(0, 9), rng.randint(0, 9)
+    if not finalized:
+        return f"⏰#N{game}. ▶️ {p}({player}) - {b}({banker})"
+    marker = rng.choice(('✅', '🔰', '✅', '✅'))
+    return f"#N{game}. {marker}{p}({player}) - {b}({banker}) #T{p + b}"
+
+
+def stats_message(rng: random.Random, counts: dict) -> str:
+    lines = [f"{glyph} : {counts[glyph[0]]}" for glyph in STATS_GLYPHS]
+    return "📊 STATISTIQUES DU JOUR\n\n" + "\n".join(lines)
+
+
+def load_corpus(path: str) -> list:
+    """Charge un export (une ligne JSON par message avec la clé 'text')."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line)['text'] for line in f if line.strip()]
+
+
+def synthetic_corpus(n: int = 2000, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    counts = {s[0]: 0 for s in STATS_GLYPHS}
+    messages = []
+    game = rng.randint(100, 900)
+    while len(messages) < n:
+        messages.append(source_message(rng, game, False))
+        messages.append(source_message(rng, game, True))
+        counts[rng.choice(STATS_GLYPHS)[0]] += 1
+        messages.append(stats_message(rng, counts))
+        game += 1
+    return messages[:n]
+
+
+def synthetic_stream(games: int = 1000, seed: int = 7, start: float = 1767225600.0,
+                     game_seconds: float = 60.0, first_game: int = 6, stats_window: int = 100) -> list:
+    """
+    Flux horodaté au format RECORD_STREAM: pour chaque jeu, publication
+    en cours (⏰), édition finalisée, puis statistiques du canal 2
+    (apparitions de chaque costume sur les `stats_window` derniers jeux).
+    """
+    rng = random.Random(seed)
+    counts = {s[0]: 0 for s in STATS_GLYPHS}
+    history = []
+    events = []
+    for i in range(games):
+        game = first_game + i
+        t = start + i * game_seconds
+        events.append({'t': t, 'channel': 'source', 'edit': False,
+                       'text': source_message(rng, game, False)})
+        final = source_message(rng, game, True)
+        events.append({'t': t + game_seconds * 0.6, 'channel': 'source', 'edit': True, 'text': final})
+        first_group = final[final.index('(') + 1:final.index(')')]
+        present = [suit for suit in counts
+                   if suit in first_group or (suit == '♥' and '❤' in first_group)]
+        history.append(present)
+        for suit in present:
+            counts[suit] += 1
+        if len(history) > stats_window:
+            for suit in history.pop(0):
+                counts[suit] -= 1
+        events.append({'t': t + game_seconds * 0.7, 'channel': 'stats', 'edit': False,
+                       'text': stats_message(rng, counts)})
+    return events
+
+
+def load_stream(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda e: e['t'])
+    return events
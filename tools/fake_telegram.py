@@ -0,0 +1,141 @@
+"""
+Faux Telegram en mémoire pour les tests de charge: les appels Telethon
+utilisés par le bot (send_message, edit_message, forward_messages) et des
+événements NewMessage à passer au dispatcher, avec latence tirée d'une loi
+configurable, FloodWait injectés et utilisateurs ayant bloqué le bot.
+"""
+import asyncio
+import itertools
+import math
+import random
+import time
+from telethon import errors
+
+
+class Latency:
+    """
+    Loi de latence d'un appel API, en secondes:
+      fixed:M / uniform:A-B / lognormal:MEDIANE,SIGMA (ex: 'lognormal:0.05,0.6')
+    """
+
+    def __init__(self, spec: str = 'lognormal:0.05,0.6', seed: int = 7):
+        self.spec = spec
+        self.rng = random.Random(seed)
+        kind, _, params = spec.partition(':')
+        values = [float(v) for v in params.replace('-', ',').split(',') if v]
+        if kind == 'fixed' and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == 'uniform' and len(values) == 2:
+            self._sample = lambda: self.rng.uniform(values[0], values[1])
+        elif kind == 'lognormal' and len(values) == 2:
+            mu = math.log(values[0])
+            self._sample = lambda: self.rng.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(f"Loi de latence invalide: '{spec}'")
+
+    def sample(self) -> float:
+        return self._sample()
+
+
+class FakeMessage:
+    __slots__ = ('id', 'chat_id', 'message', 'buttons', 'photo')
+
+    def __init__(self, msg_id, chat_id, message, buttons=None, photo=None):
+        self.id = msg_id
+        self.chat_id = chat_id
+        self.message = message
+        self.buttons = buttons
+        self.photo = photo
+
+
+class FakeTelegram:
+    """
+    Client factice. `flood_rate`: probabilité qu'un appel reçoive un
+    FloodWait de `flood_seconds`; `blocked`: user_id qui ont bloqué le bot
+    (UserIsBlockedError). Chaque livraison est horodatée (time.monotonic)
+    dans `deliveries` pour les percentiles de latence.
+    """
+
+    def __init__(self, latency: Latency = None, flood_rate: float = 0.0, flood_seconds: int = 3,
+                 blocked=(), seed: int = 7):
+        self.latency = latency or Latency('fixed:0')
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.blocked = set(blocked)
+        self.rng = random.Random(seed)
+        self.messages = {}
+        self.deliveries = []
+        self.api_latencies = []
+        self.calls = {'send_message': 0, 'edit_message': 0, 'forward_messages': 0}
+        self.flood_waits = 0
+        self._ids = itertools.count(1)
+
+    def reset_stats(self):
+        self.deliveries.clear()
+        self.api_latencies.clear()
+        for name in self.calls:
+            self.calls[name] = 0
+        self.flood_waits = 0
+
+    async def _call(self, name: str, chat_id):
+        self.calls[name] += 1
+        delay = self.latency.sample()
+        self.api_latencies.append(delay)
+        await asyncio.sleep(delay)
+        if self.flood_rate and self.rng.random() < self.flood_rate:
+            self.flood_waits += 1
+            raise errors.FloodWaitError(request=None, capture=self.flood_seconds)
+        if chat_id in self.blocked:
+            raise errors.UserIsBlockedError(request=None)
+
+    async def send_message(self, entity, message, buttons=None, **kwargs):
+        await self._call('send_message', entity)
+        msg = FakeMessage(next(self._ids), entity, message, buttons)
+        self.messages[(entity, msg.id)] = msg
+        self.deliveries.append(time.monotonic())
+        return msg
+
+    async def edit_message(self, entity, message, text=None, **kwargs):
+        await self._call('edit_message', entity)
+        msg_id = getattr(message, 'id', message)
+        msg = self.messages.get((entity, msg_id))
+        if msg is None:
+            raise errors.MessageIdInvalidError(request=None)
+        msg.message = text
+        self.deliveries.append(time.monotonic())
+        return msg
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        await self._call('forward_messages', entity)
+        single = not isinstance(messages, (list, tuple))
+        forwarded = [FakeMessage(next(self._ids), entity, getattr(m, 'message', None), photo=getattr(m, 'photo', None))
+                     for m in ([messages] if single else messages)]
+        for msg in forwarded:
+            self.messages[(entity, msg.id)] = msg
+        self.deliveries.append(time.monotonic())
+        return forwarded[0] if single else forwarded
+
+    def event(self, chat_id: int, text: str, sender_id: int = None, photo=None):
+        """
+        Événement NewMessage factice pour Dispatcher.on_new_message /
+        on_edited_message: canal si chat_id est au format -100..., sinon privé.
+        """
+        return FakeEvent(self, chat_id, text, sender_id, photo)
+
+
+class FakeEvent:
+    def __init__(self, backend: FakeTelegram, chat_id: int, text: str, sender_id: int = None, photo=None):
+        self.backend = backend
+        self.chat_id = chat_id
+        self.sender_id = sender_id if sender_id is not None else chat_id
+        self.is_private = chat_id > 0
+        self.is_channel = str(chat_id).startswith('-100')
+        self.is_group = not (self.is_private or self.is_channel)
+        self.message = FakeMessage(next(backend._ids), chat_id, text, photo=photo)
+        self.pattern_match = None
+        self.responses = []
+
+    async def respond(self, message, **kwargs):
+        msg = await self.backend.send_message(self.chat_id, message, **kwargs)
+        self.responses.append(msg)
+        return msg
@@ -0,0 +1,259 @@
+"""
+Test de charge du bot avec un faux Telegram (tools/fake_telegram.py) et
+une base d'utilisateurs synthétique (essais, abonnements, expirés).
+
+Quatre phases:
+  broadcast  send_prediction_to_all_users vers tous les éligibles
+  edit       edit_prediction_for_all_users sur les messages envoyés
+  flow       flux synthétique des canaux sources passé au dispatcher
+             (handle_message, acteur de jeu): Règle 1 / Règle 2,
+             diffusion puis édition des résultats
+  payment    /payer puis capture d'écran de paiement: transfert à
+             l'admin avec les boutons de validation
+
+    python tools/loadtest.py --users 10000,100000 --latency lognormal:0.05,0.6 \\
+        --concurrency 200 --flood 0.001 --blocked 0.02 [--tracemalloc]
+
+--rate limite le débit global (messages/s) comme en production (défaut:
+illimité, pour mesurer le bot lui-même).
+"""
+import argparse
+import asyncio
+import logging
+import random
+import resource
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from _bootstrap import load_main
+from clock import SimulatedClock
+from corpus import synthetic_stream
+from fake_telegram import FakeTelegram, Latency
+from tracing import percentile
+
+# Répartition par défaut des comptes (part de la base)
+DEFAULT_MIX = {
+    'unregistered': 0.05,     # /start sans inscription terminée
+    'trial_active': 0.10,
+    'trial_expired': 0.45,
+    'subscribed': 0.30,
+    'subscription_expired': 0.10,
+}
+
+
+class LoadClock(SimulatedClock):
+    """
+    Heure de jeu simulée (cycle R1, essais) mais monotonic()/sleep() réels:
+    latences, anti-flood et traces sont mesurés en temps réel.
+    """
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(max(0.0, seconds))
+
+
+def synthetic_users(count: int, now: datetime, seed: int = 7, mix: dict = None,
+                    trial_duration: timedelta = timedelta(minutes=60)) -> dict:
+    """users_data synthétique: {user_id: fiche} selon `mix` (parts par type de compte)."""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    users = {}
+    for i in range(count):
+        user_id = str(100_000_000 + i)
+        kind = rng.choices(kinds, weights)[0]
+        user = {
+            'prenom': f"User{i}", 'nom': 'Test', 'pays': rng.choice(['Bénin', 'Togo', "Côte d'Ivoire"]),
+            'registered': kind != 'unregistered',
+        }
+        if kind == 'trial_active':
+            user['trial_started'] = (now - rng.random() * trial_duration).isoformat()
+            user['trial_used'] = False
+        elif kind != 'unregistered':
+            user['trial_started'] = (now - timedelta(days=rng.uniform(1, 60))).isoformat()
+            user['trial_used'] = True
+        if kind == 'subscribed':
+            user['subscription_end'] = (now + timedelta(hours=rng.uniform(1, 14 * 24))).isoformat()
+            user['subscription_type'] = 'premium'
+        elif kind == 'subscription_expired':
+            user['subscription_end'] = (now - timedelta(hours=rng.uniform(1, 30 * 24))).isoformat()
+            user['subscription_type'] = 'premium'
+        users[user_id] = user
+    return users
+
+
+def latency_summary(start: float, deliveries) -> str:
+    values = sorted((t - start) * 1000 for t in deliveries)
+    if not values:
+        return "aucune livraison"
+    return (f"p50 {percentile(values, 50):.0f} ms, p95 {percentile(values, 95):.0f} ms, "
+            f"p99 {percentile(values, 99):.0f} ms")
+
+
+def peak_memory() -> str:
+    # ru_maxrss en Ko sous Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    text = f"RSS max {rss:.0f} Mo"
+    if tracemalloc.is_tracing():
+        _, peak = tracemalloc.get_traced_memory()
+        text += f", pic Python {peak / 1024 / 1024:.1f} Mo"
+    return text
+
+
+def configure(bot, fake, clock, args):
+    bot.client = fake
+    bot.set_clock(clock)
+    bot.broadcast_engine.concurrency = args.concurrency
+    flood = bot.flood_control
+    flood.rate = args.rate or 1e9
+    flood.burst = max(1, int(min(flood.rate, 1e6)))
+    flood._tokens = float(flood.burst)
+    flood.per_chat_interval = args.per_chat if args.rate else 0.0
+
+
+async def phase_broadcast(bot, fake, rounds: int) -> list:
+    sent_maps = []
+    for i in range(rounds):
+        fake.reset_stats()
+        game = 1000 + i * 10
+        start = time.monotonic()
+        private = await bot.send_prediction_to_all_users(f"🎰 PRÉDICTION #{game}\n🎯 Couleur: ♠️", game, "R1")
+        elapsed = time.monotonic() - start
+        print(f"  envoi #{game}: {len(private)} messages en {elapsed:.2f}s "
+              f"({len(private) / elapsed:,.0f} msg/s) | {latency_summary(start, fake.deliveries)} | "
+              f"FloodWait {fake.flood_waits} | {peak_memory()}")
+        sent_maps.append((game, private))
+    return sent_maps
+
+
+async def phase_edit(bot, fake, sent_maps):
+    for game, private in sent_maps:
+        fake.reset_stats()
+        start = time.monotonic()
+        edited = await bot.edit_prediction_for_all_users(game, '✅0️⃣', '♠', 'R1', private_msgs=dict(private))
+        elapsed = time.monotonic() - start
+        print(f"  édition #{game}: {edited} messages en {elapsed:.2f}s "
+              f"({edited / elapsed:,.0f} msg/s) | {latency_summary(start, fake.deliveries)} | {peak_memory()}")
+
+
+async def phase_flow(bot, fake, clock, games: int, seed: int):
+    """Flux source joué message par message: chaque diffusion/édition se termine avant le suivant."""
+    events = synthetic_stream(games, seed, start=clock.now().timestamp())
+    channels = {'source': bot.SOURCE_CHANNEL_ID, 'stats': bot.SOURCE_CHANNEL_2_ID}
+    bot.next_prediction_allowed_at = clock.now()
+    fake.reset_stats()
+    runner = asyncio.create_task(bot.game_actor.run())
+    start = time.monotonic()
+    try:
+        for event in events:
+            bot.game_actor.post_call(clock.set, datetime.fromtimestamp(event['t']))
+            update = fake.event(channels[event['channel']], event['text'])
+            if event.get('edit'):
+                await bot.dispatcher.on_edited_message(update)
+            else:
+                await bot.dispatcher.on_new_message(update)
+            await bot.game_actor.join()
+            await bot.io_queue.drain()
+    finally:
+        runner.cancel()
+    elapsed = time.monotonic() - start
+    bilan = bot.stats_bilan
+    print(f"  flux: {len(events)} messages / {games} jeux en {elapsed:.1f}s | "
+          f"{bilan['total']} prédictions résolues, {fake.calls['send_message']} envois, "
+          f"{fake.calls['edit_message']} éditions | {peak_memory()}")
+    for stage, stats in bot.tracer.summary().items():
+        print(f"    {stage:<15} n={stats['count']:<4} p50 {stats['p50']:8.1f} ms  "
+              f"p95 {stats['p95']:8.1f} ms  p99 {stats['p99']:8.1f} ms")
+    print_routes(bot, ('source', 'source_edit'))
+
+
+async def phase_payment(bot, fake, count: int, concurrency: int):
+    """`count` utilisateurs inscrits: /payer puis envoi de la capture (route privée)."""
+    user_ids = [int(uid) for uid, user in bot.users_data.items() if user.get('registered')][:count]
+    fake.reset_stats()
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def pay(user_id):
+        async with semaphore:
+            await bot.dispatcher.on_new_message(fake.event(user_id, '/payer'))
+            start = time.monotonic()
+            update = fake.event(user_id, '', photo=object())
+            await bot.dispatcher.on_new_message(update)
+            durations.append(time.monotonic() - start)
+            return bool(update.responses) and update.responses[-1].message.startswith('📸')
+
+    start = time.monotonic()
+    accepted = sum(await asyncio.gather(*(pay(user_id) for user_id in user_ids)))
+    elapsed = time.monotonic() - start
+    forwarded = sum(1 for user_id in user_ids if user_id in bot.pending_screenshots)
+    print(f"  paiement: {len(user_ids)} captures en {elapsed:.2f}s | {accepted} accusés, "
+          f"{fake.calls['forward_messages']} transferts admin ({forwarded} en attente de validation) | "
+          f"{latency_summary(0.0, durations)} | {peak_memory()}")
+    print_routes(bot, ('command:/payer', 'private'))
+    for user_id in user_ids:
+        bot.pending_screenshots.pop(user_id, None)
+        bot.deadline_scheduler.cancel(bot.payment_timeout_key(user_id))
+
+
+def print_routes(bot, names):
+    for name, count, avg, peak, errors in bot.dispatcher.summary(limit=len(bot.dispatcher.stats)):
+        if name in names:
+            print(f"    route {name:<15} n={count:<5} moy {avg:6.2f} ms  max {peak:7.1f} ms  erreurs {errors}")
+
+
+async def run(bot, count: int, args):
+    clock = LoadClock(datetime(2026, 1, 1, 12, 0))
+    fake = FakeTelegram(Latency(args.latency, args.seed), args.flood, args.flood_seconds, seed=args.seed)
+    configure(bot, fake, clock, args)
+
+    began = time.monotonic()
+    bot.users_data = synthetic_users(count, clock.now(), args.seed)
+    bot.rebuild_eligibility_index()
+    eligible = bot.eligibility_index.members()
+    rng = random.Random(args.seed)
+    fake.blocked = {int(uid) for uid in eligible if rng.random() < args.blocked}
+    print(f"\n👥 {count:,} utilisateurs ({len(eligible):,} éligibles, {len(fake.blocked):,} bloqués) "
+          f"générés en {time.monotonic() - began:.2f}s | {peak_memory()}")
+
+    sent_maps = await phase_broadcast(bot, fake, args.rounds)
+    await phase_edit(bot, fake, sent_maps)
+    if args.games:
+        await phase_flow(bot, fake, clock, args.games, args.seed)
+    if args.payments:
+        await phase_payment(bot, fake, args.payments, args.concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', default='10000', help="tailles de base, ex: 10000,100000")
+    parser.add_argument('--latency', default='lognormal:0.05,0.6', help="fixed:M | uniform:A-B | lognormal:MED,SIGMA")
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=0, help="messages/s global (0 = illimité)")
+    parser.add_argument('--per-chat', type=float, default=1.0, help="espacement par chat si --rate")
+    parser.add_argument('--flood', type=float, default=0.0, help="probabilité de FloodWait par appel")
+    parser.add_argument('--flood-seconds', type=int, default=3)
+    parser.add_argument('--blocked', type=float, default=0.02, help="part d'utilisateurs ayant bloqué le bot")
+    parser.add_argument('--rounds', type=int, default=2, help="diffusions mesurées par taille")
+    parser.add_argument('--games', type=int, default=30, help="jeux du flux complet (0 = phase ignorée)")
+    parser.add_argument('--payments', type=int, default=200, help="captures de paiement (0 = phase ignorée)")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--tracemalloc', action='store_true', help="pic mémoire Python (plus lent)")
+    args = parser.parse_args()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    bot = load_main(logging.WARNING)
+    for count in (int(c) for c in args.users.split(',')):
+        bot.reset_prediction_state()
+        bot.tracer.completed.clear()
+        bot.dispatcher.stats.clear()
+        asyncio.run(run(bot, count, args))
+
+
+if __name__ == '__main__':
+    main()
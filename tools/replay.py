@@ -0,0 +1,195 @@
+"""
+Relecture hors ligne (backtest) des Règles 1 et 2 sur un flux enregistré.
+
+Le flux (JSONL, voir RECORD_STREAM dans config.py) est déposé dans l'acteur
+de jeu (game_actor), donc process_prediction_logic_rule1,
+process_stats_message et process_finalized_message, avec une horloge simulée
+et un client Telegram factice. Plusieurs réglages peuvent être balayés:
+
+    python tools/replay.py --stream flux.jsonl --max-r1 2,3,4 --user-a 1,2 \\
+        --time-cycle "5,8,3,7,9;6,8,4,7,9"
+    python tools/replay.py --synthetic 20000
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import sys
+import time
+from datetime import datetime
+
+from _bootstrap import load_main
+from corpus import load_stream, synthetic_stream
+from clock import SimulatedClock
+from game_actor import SourceMessage
+
+FINAL_STATUSES = ('✅0️⃣', '✅1️⃣', '✅2️⃣', '✅3️⃣', '❌')
+
+
+class StubMessage:
+    __slots__ = ('id',)
+
+    def __init__(self, msg_id):
+        self.id = msg_id
+
+
+class StubClient:
+    """Client factice: les envois réussissent instantanément."""
+
+    def __init__(self):
+        self.sent = 0
+        self.edited = 0
+
+    async def send_message(self, entity, message, **kwargs):
+        self.sent += 1
+        return StubMessage(self.sent)
+
+    async def edit_message(self, entity, message_id, text=None, **kwargs):
+        self.edited += 1
+
+
+def reset_engine(main, time_cycle, user_a, max_r1, start):
+    main.game_actor.reset()
+    main.io_queue.reset()
+    main.reset_prediction_state()
+    main.suit_prediction_counts.clear()
+    main.stats_bilan = {'total': 0, 'wins': 0, 'losses': 0,
+                        'win_details': {'✅0️⃣': 0, '✅1️⃣': 0, '✅2️⃣': 0},
+                        'loss_details': {'❌': 0}}
+    main.TIME_CYCLE = list(time_cycle)
+    main.USER_A = user_a
+    main.MAX_RULE1_CONSECUTIVE = max_r1
+    main.next_prediction_allowed_at = datetime.fromtimestamp(start)
+
+
+def install_fast_io(main, stub):
+    """
+    Court-circuite le moteur de diffusion: un seul destinataire (l'admin)
+    via le client factice, pour mesurer uniquement la logique de jeu.
+    """
+    async def send_prediction_to_all_users(prediction_msg, target_game, rule_type="R2", trace=None):
+        msg = await stub.send_message(main.ADMIN_ID, prediction_msg)
+        return {str(main.ADMIN_ID): msg.id}
+
+    async def edit_prediction_for_all_users(game_number, new_status, suit, rule_type,
+                                            original_game=None, private_msgs=None):
+        await stub.edit_message(main.ADMIN_ID, 0, new_status)
+        return 1
+
+    main.send_prediction_to_all_users = send_prediction_to_all_users
+    main.edit_prediction_for_all_users = edit_prediction_for_all_users
+
+
+def install_rule_tracker(main, breakdown):
+    original = main.update_prediction_status
+
+    async def update_prediction_status(game_number, new_status):
+        pred = main.pending_predictions.get(game_number)
+        if pred is not None and new_status in FINAL_STATUSES:
+            rule = pred.get('rule_type', 'R2')
+            breakdown.setdefault(rule, {}).setdefault(new_status, 0)
+            breakdown[rule][new_status] += 1
+        return await original(game_number, new_status)
+
+    main.update_prediction_status = update_prediction_status
+    return original
+
+
+async def replay(main, events, clock):
+    channels = {'source': main.SOURCE_CHANNEL_ID, 'stats': main.SOURCE_CHANNEL_2_ID}
+    actor = main.game_actor
+    runner = asyncio.create_task(actor.run())
+    for event in events:
+        when = datetime.fromtimestamp(event['t'])
+        if clock.next_deadline is not None:
+            # Réveille les minuteurs simulés (timeouts paiement, reset...) à leur échéance
+            await actor.join()
+            if clock.next_deadline <= (when - clock.current).total_seconds():
+                await clock.advance_to(when)
+        # L'horloge avance dans l'acteur, juste avant le message: pas d'attente par événement
+        actor.post_call(clock.set, when)
+        chat_id = channels.get(event.get('channel'), event.get('chat_id'))
+        actor.post(SourceMessage(event['text'], chat_id, event.get('edit', False)))
+    await actor.join()
+    await main.io_queue.drain()
+    runner.cancel()
+
+
+def run_config(main, events, clock, time_cycle, user_a, max_r1):
+    start = events[0]['t']
+    clock.set(datetime.fromtimestamp(start))
+    reset_engine(main, time_cycle, user_a, max_r1, start)
+    breakdown = {}
+    original = install_rule_tracker(main, breakdown)
+    errors_before = main.game_actor.errors + main.io_queue.errors
+    try:
+        began = time.perf_counter()
+        asyncio.run(replay(main, events, clock))
+        elapsed = time.perf_counter() - began
+    finally:
+        main.update_prediction_status = original
+    # Un handler en erreur abandonne le message: les chiffres ne sont pas fiables
+    errors = main.game_actor.errors + main.io_queue.errors - errors_before
+    return dict(main.stats_bilan), breakdown, elapsed, errors
+
+
+def format_result(bilan, breakdown):
+    total = bilan['total']
+    win_pct = (bilan['wins'] / total * 100) if total else 0.0
+    details = ' '.join(f"{k}:{v}" for k, v in sorted(bilan['win_details'].items()))
+    rules = ' | '.join(
+        f"{rule}: {sum(v for k, v in counts.items() if k != '❌')}✅/{counts.get('❌', 0)}❌"
+        for rule, counts in sorted(breakdown.items())
+    )
+    return f"{total:5d} préd. {win_pct:5.1f}% gains [{details} ❌:{bilan['losses']}] {rules}"
+
+
+def parse_list(value, cast=int):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--stream', help="flux JSONL enregistré (RECORD_STREAM)")
+    source.add_argument('--synthetic', type=int, default=5000, help="nombre de jeux synthétiques")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--time-cycle', help="cycles séparés par ';' (ex: '5,8,3;6,8,4')")
+    parser.add_argument('--user-a', default=None, help="valeurs de USER_A (ex: 1,2)")
+    parser.add_argument('--max-r1', default=None, help="valeurs de MAX_RULE1_CONSECUTIVE (ex: 2,3)")
+    args = parser.parse_args()
+
+    bot = load_main(logging.ERROR)
+    events = load_stream(args.stream) if args.stream else synthetic_stream(args.synthetic, args.seed)
+    if not events:
+        parser.error("flux vide")
+
+    stub = StubClient()
+    bot.client = stub
+    install_fast_io(bot, stub)
+    clock = SimulatedClock(datetime.fromtimestamp(events[0]['t']))
+    bot.set_clock(clock)
+
+    cycles = [parse_list(c) for c in args.time_cycle.split(';')] if args.time_cycle else [list(bot.TIME_CYCLE)]
+    user_as = parse_list(args.user_a) if args.user_a else [bot.USER_A]
+    max_r1s = parse_list(args.max_r1) if args.max_r1 else [bot.MAX_RULE1_CONSECUTIVE]
+    games = sum(1 for e in events if e.get('channel') == 'source' and not e.get('edit'))
+
+    print(f"Flux: {len(events)} messages, ~{games} jeux")
+    failed = 0
+    for cycle, user_a, max_r1 in itertools.product(cycles, user_as, max_r1s):
+        bilan, breakdown, elapsed, errors = run_config(bot, events, clock, cycle, user_a, max_r1)
+        cycle_label = ','.join(map(str, cycle))
+        if len(cycle_label) > 20:
+            cycle_label = cycle_label[:17] + '...'
+        print(f"cycle={cycle_label:<20} a={user_a} maxR1={max_r1} | {format_result(bilan, breakdown)}"
+              f" | {games / elapsed:,.0f} jeux/s" + (f" | ❌ {errors} erreurs de traitement" if errors else ""))
+        failed += bool(errors)
+
+    if failed:
+        print(f"❌ {failed} configuration(s) avec erreurs de traitement: résultats non fiables")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Traçage de latence de bout en bout: chaque message source reçoit un ID de
+trace, horodaté à chaque étape (acteur, parsing, règle, file, diffusion);
+les traces des prédictions envoyées sont conservées dans un tampon circulaire.
+"""
+import itertools
+import math
+from collections import deque
+
+# Étapes dans l'ordre habituel; la durée d'une étape est mesurée depuis
+# l'étape horodatée juste avant elle. 'rule' est marquée au moment où une
+# règle décide de prédire (avant la mise en file ou l'envoi), sinon à la
+# fin de l'évaluation du message.
+STAGES = (
+    'received',        # réception par le handler Telegram
+    'actor',           # prise en charge par l'acteur de jeu
+    'parsed',          # message analysé
+    'rule',            # Règle 1 / Règle 2 évaluée
+    'queued',          # prédiction mise en file d'attente
+    'send',            # commande d'envoi confiée à la file d'E/S
+    'broadcast',       # début de la diffusion
+    'first_delivery',  # premier utilisateur servi
+    'last_delivery',   # dernier utilisateur servi
+)
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Percentile par rang le plus proche sur une liste déjà triée."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Trace:
+    __slots__ = ('trace_id', 'marks', 'target_game', 'rule_type')
+
+    def __init__(self, trace_id: int, marks: dict = None):
+        self.trace_id = trace_id
+        self.marks = marks if marks is not None else {}
+        self.target_game = None
+        self.rule_type = None
+
+    def mark(self, stage: str, when: float):
+        # Première occurrence uniquement (ex: plusieurs mises en file)
+        self.marks.setdefault(stage, when)
+
+    def fork(self, trace_id: int) -> 'Trace':
+        """Copie pour une prédiction issue de ce message (un message peut en déclencher plusieurs)."""
+        return Trace(trace_id, dict(self.marks))
+
+    def durations(self) -> dict:
+        result = {}
+        previous = None
+        for stage, when in sorted(self.marks.items(), key=lambda item: item[1]):
+            if previous is not None:
+                result[stage] = when - previous
+            previous = when
+        start = self.marks.get('received')
+        end = self.marks.get('last_delivery')
+        if start is not None and end is not None:
+            result['total'] = end - start
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'target_game': self.target_game,
+            'rule_type': self.rule_type,
+            'durations_ms': {k: round(v * 1000, 2) for k, v in self.durations().items()},
+        }
+
+
+class Tracer:
+    """
+    `current` est la trace du message en cours de traitement dans l'acteur
+    (un seul consommateur: pas de contexte à propager).
+    """
+
+    def __init__(self, clock, capacity: int = 200):
+        self.clock = clock
+        self.completed = deque(maxlen=capacity)
+        self.current = None
+        self._ids = itertools.count(1)
+
+    def start(self, received: float = None) -> Trace:
+        trace = Trace(next(self._ids))
+        trace.mark('received', received if received is not None else self.clock.monotonic())
+        return trace
+
+    def mark(self, stage: str):
+        """Horodate une étape de la trace courante (sans effet hors d'un message source)."""
+        if self.current is not None:
+            self.current.mark(stage, self.clock.monotonic())
+
+    def fork_current(self, target_game: int, rule_type: str):
+        if self.current is None:
+            return None
+        trace = self.current.fork(next(self._ids))
+        trace.target_game = target_game
+        trace.rule_type = rule_type
+        return trace
+
+    def finish(self, trace: Trace):
+        self.completed.append(trace)
+
+    def summary(self, last: int = None) -> dict:
+        """{étape: {'count', 'p50', 'p95', 'p99'}} en ms sur les `last` dernières prédictions."""
+        traces = list(self.completed)
+        if last:
+            traces = traces[-last:]
+        samples = {}
+        for trace in traces:
+            for stage, value in trace.durations().items():
+                samples.setdefault(stage, []).append(value * 1000)
+        result = {}
+        for stage in STAGES[1:] + ('total',):
+            values = sorted(samples.get(stage, ()))
+            if values:
+                result[stage] = {
+                    'count': len(values),
+                    'p50': round(percentile(values, 50), 2),
+                    'p95': round(percentile(values, 95), 2),
+                    'p99': round(percentile(values, 99), 2),
+                }
+        return result
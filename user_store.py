@@ -0,0 +1,209 @@
+"""
+Stockage SQLite des utilisateurs (une ligne par utilisateur, mode WAL)
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    registered INTEGER NOT NULL DEFAULT 0,
+    trial_started TEXT,
+    subscription_end TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_subscription_end ON users(subscription_end);
+CREATE INDEX IF NOT EXISTS idx_users_registered ON users(registered);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS deadlines (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    due REAL NOT NULL,
+    payload TEXT
+);
+"""
+
+UPSERT_SQL = """
+INSERT INTO users (user_id, registered, trial_started, subscription_end, data)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    registered = excluded.registered,
+    trial_started = excluded.trial_started,
+    subscription_end = excluded.subscription_end,
+    data = excluded.data
+"""
+
+
+def _row(user_id_str: str, record: dict) -> tuple:
+    return (
+        user_id_str,
+        1 if record.get('registered') else 0,
+        record.get('trial_started'),
+        record.get('subscription_end'),
+        json.dumps(record, ensure_ascii=False),
+    )
+
+
+class UserStore:
+    """Dépôt utilisateurs: upsert ligne par ligne au lieu de réécrire tout le fichier."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def load_all(self) -> dict:
+        with self.lock:
+            rows = self.conn.execute("SELECT user_id, data FROM users").fetchall()
+        return {uid: json.loads(data) for uid, data in rows}
+
+    def get(self, user_id_str: str):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id_str,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def upsert(self, user_id_str: str, record: dict):
+        with self.lock:
+            self.conn.execute(UPSERT_SQL, _row(user_id_str, record))
+
+    def upsert_many(self, items):
+        with self.lock:
+            self._upsert_many(items)
+
+    def _upsert_many(self, items):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(UPSERT_SQL, (_row(uid, rec) for uid, rec in items))
+
+    def replace_all(self, users: dict):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM users")
+            self.conn.executemany(UPSERT_SQL, (_row(uid, rec) for uid, rec in users.items()))
+
+    def get_meta(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    def load_deadlines(self) -> list:
+        """[(clé, type, échéance timestamp, données)] des échéances persistées."""
+        with self.lock:
+            rows = self.conn.execute("SELECT key, kind, due, payload FROM deadlines").fetchall()
+        return [(key, kind, due, json.loads(payload) if payload else None) for key, kind, due, payload in rows]
+
+    def save_deadline(self, key: str, kind: str, due: float, payload=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO deadlines (key, kind, due, payload) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET kind = excluded.kind, due = excluded.due, "
+                "payload = excluded.payload",
+                (key, kind, due, json.dumps(payload, ensure_ascii=False) if payload is not None else None)
+            )
+
+    def delete_deadline(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM deadlines WHERE key = ?", (key,))
+
+    def import_json(self, json_path: str) -> int:
+        """Import unique depuis l'ancien users_data.json (ignoré si déjà fait)."""
+        if self.get_meta('json_imported') or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                users = json.load(f)
+        except ValueError as e:
+            # Fichier tronqué: fatal. Démarrer à vide puis rejouer l'import une
+            # fois le fichier réparé écraserait des utilisateurs plus récents.
+            raise RuntimeError(
+                f"{json_path} illisible ({e}): réparez-le, ou supprimez-le si la base "
+                f"{self.path} est à jour"
+            ) from e
+        self.upsert_many(users.items())
+        self.set_meta('json_imported', json_path)
+        logger.info(f"Import {json_path}: {len(users)} utilisateurs migrés vers {self.path}")
+        return len(users)
+
+
+class WriteBehind:
+    """
+    Écriture différée: les modifications sont marquées et regroupées en une
+    seule transaction toutes les `interval` secondes, exécutée hors de la
+    boucle asyncio. `on_flush(nb, secondes)` est appelé après chaque écriture.
+    """
+
+    def __init__(self, store: UserStore, interval: float = 0.3, on_flush=None):
+        self.store = store
+        self.interval = interval
+        self.on_flush = on_flush
+        self._dirty = {}
+        self._generation = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def mark(self, user_id_str: str, record: dict):
+        self._dirty[user_id_str] = record
+
+    def discard(self):
+        """Oublie les écritures en attente (ex: /reset) y compris celles en cours."""
+        self._dirty = {}
+        self._generation += 1
+
+    def _write(self, items, generation: int):
+        with self.store.lock:
+            if generation != self._generation:
+                return
+            self.store._upsert_many(items)
+
+    async def flush(self):
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        items = [(uid, dict(rec)) for uid, rec in dirty.items()]
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, items, self._generation)
+        except Exception as e:
+            # Remet en file pour la prochaine tentative
+            for uid, rec in dirty.items():
+                self._dirty.setdefault(uid, rec)
+            logger.error(f"Erreur écriture différée ({len(items)} utilisateurs): {e}")
+            return 0
+        if self.on_flush is not None:
+            self.on_flush(len(items), time.perf_counter() - start)
+        return len(items)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
@@ -0,0 +1,46 @@
+"""
+Corps HTTP précalculés pour les pages sondées en boucle (moniteurs, Render):
+le rendu, la compression gzip et l'ETag ne sont refaits que lorsque la clé
+d'état change.
+"""
+import gzip
+import hashlib
+
+from aiohttp import web
+
+
+class CachedBody:
+    def __init__(self, render, content_type: str):
+        self.render = render
+        self.content_type = content_type
+        self.renders = 0
+        self._key = object()
+        self.body = b''
+        self.gzipped = b''
+        self.etag = ''
+
+    def get(self, key) -> 'CachedBody':
+        """Régénère le corps si `key` (tuple d'état) a changé depuis le dernier rendu."""
+        if key != self._key:
+            self.body = self.render(*key).encode('utf-8')
+            self.gzipped = gzip.compress(self.body, compresslevel=6)
+            self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:16] + '"'
+            self._key = key
+            self.renders += 1
+        return self
+
+    def response(self, request) -> web.Response:
+        headers = {
+            'ETag': self.etag,
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+        }
+        if_none_match = request.headers.get('If-None-Match', '')
+        if self.etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+            return web.Response(status=304, headers=headers)
+
+        headers['Content-Type'] = self.content_type
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            return web.Response(body=self.gzipped, headers=headers)
+        return web.Response(body=self.body, headers=headers)